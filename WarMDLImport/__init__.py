@@ -0,0 +1,56 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# bpy is only imported on registration, so the parsing core (parser.py and
+# model.py) can be used outside of Blender:
+#
+#   from WarMDLImport.parser import parse_file
+#   model = parse_file('footman.mdl') # or .mdx
+
+bl_info = {
+	"name": "Import WarCraft MDL/MDX (.mdl/.mdx)",
+	"description": "This addon allows you to import WarCraft MDL and MDX model files (.mdl/.mdx) and to export MDL files.",
+	"author": "Thomas 'CruzR' Glamsch, Mark Newbery",
+	"version": (0, 2, 2),
+	"blender": (2, 74, 0),
+	#"api": ???,
+	"location": "File > Import > WarCraft MDL/MDX (.mdl/.mdx), File > Export > WarCraft MDL (.mdl)",
+	"warning": "Assumes max 1 camera, still work in progress.",
+	"wiki_url": "http://wiki.blender.org/index.php/Extensions:2.5/Py/Scripts/Import-Export/WarCraft_MDL",
+	"tracker_url": "http://projects.blender.org/tracker/index.php?func=detail&aid=29552",
+	"category": "Import-Export"}
+
+def register():
+	import bpy
+	from .importer import ImportWarMDL, LoadWarMDLProxies, menu_func_export
+	from .exporter import ExportWarMDL, menu_func_write
+	bpy.utils.register_class(ImportWarMDL)
+	bpy.utils.register_class(LoadWarMDLProxies)
+	bpy.utils.register_class(ExportWarMDL)
+	bpy.types.INFO_MT_file_import.append(menu_func_export)
+	bpy.types.INFO_MT_file_export.append(menu_func_write)
+
+def unregister():
+	import bpy
+	from .importer import ImportWarMDL, LoadWarMDLProxies, menu_func_export
+	from .exporter import ExportWarMDL, menu_func_write
+	bpy.utils.unregister_class(ImportWarMDL)
+	bpy.utils.unregister_class(LoadWarMDLProxies)
+	bpy.utils.unregister_class(ExportWarMDL)
+	bpy.types.INFO_MT_file_import.remove(menu_func_export)
+	bpy.types.INFO_MT_file_export.remove(menu_func_write)
+
+if __name__ == "__main__":
+	register()
+
+	# test call
+	import bpy
+	bpy.ops.import_mesh.warmdl('INVOKE_DEFAULT')
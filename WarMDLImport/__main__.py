@@ -0,0 +1,26 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# The command line, see cli.py. Runs as `python -m WarMDLImport` and as a
+# script given to `blender --background --python`, which doesn't know it is
+# part of a package.
+
+import os
+import sys
+
+if __package__:
+	from .cli import main
+else:
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	from WarMDLImport.cli import main
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,81 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Parsing of many files at once. Parsing doesn't need Blender, so it can be
+# spread over a pool of worker processes while the caller (e.g. the importer
+# on Blender's main thread) builds the models that are already done.
+
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from .cache import ParseCache
+from .parser import parse_file
+from .stats import Stats
+
+# The extensions of the files we can parse.
+extensions = ('.mdl', '.mdx')
+
+# Returns all model files in a directory, sorted by name.
+# @param directory: The directory to look in (not recursively).
+def find_models(directory):
+	return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+		if name.lower().endswith(extensions))
+
+# Parses a single file, this is what the workers run. Errors are returned
+# instead of raised, so one broken file doesn't stop the others. The timings
+# are sent back along with the model.
+def _parse(job):
+	filepath, use_cache, parts, geosets, recover = job
+	stats = Stats()
+	try:
+		with stats.timer('parse'):
+			if use_cache:
+				model = ParseCache().parse_file(filepath, parts, geosets, stats, recover=recover)
+			else:
+				model = parse_file(filepath, parts, geosets, stats, recover=recover)
+		return model, None, stats
+	except Exception:
+		return None, traceback.format_exc(), stats
+
+# Parses many files in parallel and yields (filepath, model, error, stats) for
+# each of them, in the order of filepaths, as soon as it is done. model is None
+# if the file couldn't be parsed, error then holds the traceback. stats are the
+# timings of that file alone.
+# @param filepaths: The files to parse.
+# @param workers: Number of worker processes, None for one per core. With 1
+# everything is parsed in this process.
+# @param use_cache: Whether to go through the parse cache.
+# @param parts, geosets: Only read parts of the files, see
+# parser.parse_file().
+# @param stats: A Stats object the timings of all files are added to.
+# @param recover: Whether to skip the broken blocks of a file instead of
+# failing it, see parser.parse_file().
+def parse_many(filepaths, workers=None, use_cache=True, parts=None, geosets=None, stats=None,
+		recover=False):
+	jobs = [(filepath, use_cache, parts, geosets, recover) for filepath in filepaths]
+	if workers is None:
+		workers = os.cpu_count() or 1
+	workers = min(workers, len(jobs))
+	pool = None
+	if workers > 1:
+		pool = ProcessPoolExecutor(max_workers=workers)
+		results = pool.map(_parse, jobs)
+	else:
+		results = map(_parse, jobs)
+	try:
+		for job, (model, error, job_stats) in zip(jobs, results):
+			if stats is not None:
+				stats.merge(job_stats)
+			yield job[0], model, error, job_stats
+	finally:
+		if pool is not None:
+			pool.shutdown()
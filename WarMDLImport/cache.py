@@ -0,0 +1,219 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# An on-disk cache of parsed models, so re-importing an unchanged file doesn't
+# parse it again. Entries are keyed by the SHA-1 of the file contents and the
+# importer version, and the least recently used entries are evicted once the
+# cache grows past its size limit.
+#
+# A cached Model is stored as a small header, a JSON document with everything
+# but the geometry and then the raw bytes of all typed arrays.
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+from array import array
+
+from . import bl_info
+from .model import Geoset, Model
+from .parser import parse_file
+from .stats import Stats
+
+log = logging.getLogger(__name__)
+
+# Bump this whenever the layout of Model changes.
+CACHE_VERSION = 5
+
+_magic = b'WMDC'
+_header = struct.Struct('<4sII')
+
+# Replaces all typed arrays in obj by references into arrays.
+def _encode(obj, arrays):
+	if isinstance(obj, array):
+		arrays.append(obj)
+		return {'__array__': len(arrays) - 1}
+	elif isinstance(obj, dict):
+		return dict((k, _encode(v, arrays)) for k, v in obj.items())
+	elif isinstance(obj, (list, tuple)):
+		return [_encode(v, arrays) for v in obj]
+	return obj
+
+# The reverse of _encode().
+def _decode(obj, arrays):
+	if isinstance(obj, dict):
+		if '__array__' in obj:
+			return arrays[obj['__array__']]
+		return dict((k, _decode(v, arrays)) for k, v in obj.items())
+	elif isinstance(obj, list):
+		return [_decode(v, arrays) for v in obj]
+	return obj
+
+# Writes a Model in the compact cache format.
+# @param model: The Model to write.
+# @param outfile: A binary mode file object.
+def dump_model(model, outfile):
+	arrays = []
+	meta = dict((k, v) for k, v in vars(model).items() if k not in ('geosets', 'nodes'))
+	meta['geosets'] = [dict((name, getattr(g, name)) for name in Geoset.__slots__)
+		for g in model.geosets]
+	meta = _encode(meta, arrays)
+	meta['__arrays__'] = [(a.typecode, len(a) * a.itemsize) for a in arrays]
+	data = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+	outfile.write(_header.pack(_magic, CACHE_VERSION, len(data)))
+	outfile.write(data)
+	for a in arrays:
+		outfile.write(a.tobytes())
+
+# Reads a Model written by dump_model().
+# @param infile: A binary mode file object.
+def load_model(infile):
+	data = infile.read()
+	magic, version, size = _header.unpack_from(data)
+	if magic != _magic or version != CACHE_VERSION:
+		raise ValueError("Not a model cache file of version {}".format(CACHE_VERSION))
+	offset = _header.size
+	meta = json.loads(data[offset:offset + size].decode('utf-8'))
+	offset += size
+	view = memoryview(data)
+	arrays = []
+	for typecode, nbytes in meta.pop('__arrays__'):
+		a = array(typecode)
+		a.frombytes(view[offset:offset + nbytes])
+		arrays.append(a)
+		offset += nbytes
+	meta = _decode(meta, arrays)
+
+	model = Model()
+	for g in meta.pop('geosets'):
+		geoset = model.geosets.new_geoset()
+		for name, value in g.items():
+			setattr(geoset, name, value)
+	vars(model).update(meta)
+	model.nodes = dict((node['id'], node) for node in model.skeleton if 'id' in node)
+	return model
+
+# Returns the directory the cache lives in by default.
+def default_directory():
+	base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+	return os.path.join(base, 'warmdl')
+
+class ParseCache:
+	# @param directory: Where to store the cache files.
+	# @param max_size: Size limit of the whole cache in bytes.
+	def __init__(self, directory=None, max_size=256 * 1024 * 1024):
+		self.directory = directory or default_directory()
+		self.max_size = max_size
+
+	# Returns the cache key for the contents of an MDL file.
+	# @param data: The raw file contents.
+	# @param parts, geosets: The parts that were read, see parser.parse_file().
+	# @param recover: Whether broken blocks were skipped.
+	def key(self, data, parts=None, geosets=None, recover=False):
+		h = hashlib.sha1(data)
+		h.update('{}:{}:{}'.format(bl_info['version'], CACHE_VERSION, sys.byteorder).encode('ascii'))
+		if recover:
+			h.update(b':recover')
+		if parts is not None or geosets is not None:
+			h.update('{}:{}'.format(parts is not None and sorted(parts),
+				geosets is not None and sorted(geosets)).encode('ascii'))
+		return h.hexdigest()
+
+	def _path(self, key):
+		return os.path.join(self.directory, key + '.wmdc')
+
+	# Returns the cached Model for a key, or None.
+	# @param key: A key as returned by key().
+	def get(self, key):
+		path = self._path(key)
+		try:
+			with open(path, 'rb') as infile:
+				model = load_model(infile)
+		except (IOError, OSError, ValueError, KeyError, struct.error):
+			return None
+		# Touch the entry, the modification time is our LRU order.
+		try:
+			os.utime(path, None)
+		except OSError:
+			pass
+		return model
+
+	# Stores a Model and evicts old entries if the cache is too big.
+	# @param key: A key as returned by key().
+	# @param model: The Model to store.
+	def put(self, key, model):
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory)
+		path = self._path(key)
+		tmp = '{}.{}.tmp'.format(path, os.getpid())
+		with open(tmp, 'wb') as outfile:
+			dump_model(model, outfile)
+		os.replace(tmp, path)
+		self.evict()
+
+	# Deletes the least recently used entries until the cache fits into
+	# max_size.
+	def evict(self):
+		entries = []
+		total = 0
+		for name in os.listdir(self.directory):
+			if not name.endswith('.wmdc'):
+				continue
+			path = os.path.join(self.directory, name)
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			entries.append((st.st_mtime, st.st_size, path))
+			total += st.st_size
+		entries.sort()
+		for mtime, size, path in entries:
+			if total <= self.max_size:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				continue
+			total -= size
+
+	# Deletes all entries.
+	def clear(self):
+		if not os.path.isdir(self.directory):
+			return
+		for name in os.listdir(self.directory):
+			if name.endswith('.wmdc') or name.endswith('.tmp'):
+				os.remove(os.path.join(self.directory, name))
+
+	# Returns the Model of an MDL file, from the cache if possible.
+	# @param filepath: Path of the .mdl file.
+	# @param parts, geosets: Only read parts of the file, see
+	# parser.parse_file().
+	# @param stats: A Stats object to collect timings and hits in.
+	# @param workers, recover: See parser.parse_file().
+	def parse_file(self, filepath, parts=None, geosets=None, stats=None, workers=1, recover=False):
+		stats = stats or Stats()
+		with stats.timer('cache.get'):
+			with open(filepath, 'rb') as infile:
+				key = self.key(infile.read(), parts, geosets, recover)
+			model = self.get(key)
+		if model is not None:
+			stats.count('cache.hits')
+			return model
+		stats.count('cache.misses')
+		model = parse_file(filepath, parts, geosets, stats, workers, recover)
+		try:
+			with stats.timer('cache.put'):
+				self.put(key, model)
+		except (IOError, OSError):
+			log.warning("Couldn't write to the parse cache in %s", self.directory)
+		return model
@@ -0,0 +1,271 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Converts many model files at once from the command line, without a Blender
+# UI. Parsing doesn't need Blender, so the parsed-model (.wmdc, see
+# cache.dump_model()) and MDL outputs work with plain Python, .blend files need
+# Blender in background mode:
+#
+#   python -m WarMDLImport --format wmdc --out parsed 'models/*.mdx'
+#   blender --background --python WarMDLImport/__main__.py -- --out blends 'models/*.mdl'
+#
+# The files are parsed by a pool of worker processes, while the main process
+# writes the ones that are done. A table of the per file timings is printed at
+# the end.
+
+import argparse
+import glob
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+
+from . import bl_info
+from .batch import extensions, find_models, parse_many
+from .cache import dump_model
+from .model import format_diagnostic
+from .parser import parse_indices
+from .stats import Stats
+from .writer import write_file
+
+log = logging.getLogger(__name__)
+
+# The output formats and the extensions of their files.
+formats = {
+	'blend': '.blend',
+	'wmdc': '.wmdc',
+	'mdl': '.mdl',
+	}
+
+# The parts parser.parse_file() knows.
+_parts = ('GEOMETRY', 'BOUNDS', 'SKELETON', 'ANIMATION', 'MATERIALS', 'CAMERA')
+
+# Returns whether we run inside Blender.
+def _have_bpy():
+	return importlib.util.find_spec('bpy') is not None
+
+# Returns the model files matching glob patterns, directories stand for all
+# models in them. Each file is returned once, in the order found.
+# @param patterns: Paths, glob patterns (** needs Python 3.5) and
+# directories.
+def expand(patterns):
+	filepaths = []
+	seen = set()
+	for pattern in patterns:
+		if os.path.isdir(pattern):
+			matches = find_models(pattern)
+		else:
+			try:
+				matches = sorted(glob.glob(pattern, recursive=True))
+			except TypeError:
+				matches = sorted(glob.glob(pattern))
+		if not matches:
+			log.warning("%s matches no files", pattern)
+		for filepath in matches:
+			key = os.path.normcase(os.path.realpath(filepath))
+			if filepath.lower().endswith(extensions) and key not in seen:
+				seen.add(key)
+				filepaths.append(filepath)
+	return filepaths
+
+# Returns the output path of every input file. Raises a ValueError if two
+# inputs would end up in the same file or an input would be overwritten.
+# @param directory: The output directory, None to write next to the inputs.
+# @param ext: The extension of the outputs.
+def output_paths(filepaths, directory, ext):
+	outputs = {}
+	used = {}
+	for filepath in filepaths:
+		stem = os.path.splitext(os.path.basename(filepath))[0]
+		output = os.path.join(directory or os.path.dirname(filepath), stem + ext)
+		key = os.path.normcase(os.path.realpath(output))
+		if key == os.path.normcase(os.path.realpath(filepath)):
+			raise ValueError("{} would overwrite itself".format(filepath))
+		if key in used:
+			raise ValueError("{} and {} would both be written to {}".format(used[key], filepath, output))
+		used[key] = filepath
+		outputs[filepath] = output
+	return outputs
+
+# Writes parsed models to .wmdc or .mdl files.
+class ModelConverter:
+	# @param fmt: 'wmdc' or 'mdl'.
+	def __init__(self, fmt):
+		self.fmt = fmt
+
+	# Writes one model.
+	# @param filepath: The file the model was parsed from.
+	# @param output: The file to write.
+	# @param stats: The Stats of this file.
+	def convert(self, model, filepath, output, stats):
+		if self.fmt == 'mdl':
+			write_file(model, output, stats)
+		else:
+			with open(output, 'wb') as outfile:
+				dump_model(model, outfile)
+
+# Builds parsed models in an empty scene and saves each as a .blend file.
+# Needs Blender, the meshes and images of one file are reused by the later
+# ones like in an interactive session.
+class BlendConverter:
+	# @param weld: See DataImporter.
+	def __init__(self, weld=True):
+		import bpy
+		self.bpy = bpy
+		self.weld = weld
+
+	# Removes all objects from the scene, the data blocks nothing uses
+	# anymore aren't saved.
+	def clear_scene(self, scene):
+		for obj in list(scene.objects):
+			scene.objects.unlink(obj)
+			if obj.users == 0:
+				self.bpy.data.objects.remove(obj)
+		scene.timeline_markers.clear()
+
+	def convert(self, model, filepath, output, stats):
+		from .importer import DataImporter
+		bpy = self.bpy
+		self.clear_scene(bpy.context.scene)
+		DataImporter(stats, weld=self.weld).build(model, bpy.context, filepath)
+		with stats.timer('save'):
+			bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(output), check_existing=False, copy=True)
+
+# Returns the command line arguments after Blender's, which end at '--'.
+def _script_args():
+	if '--' in sys.argv:
+		return sys.argv[sys.argv.index('--') + 1:]
+	return sys.argv[1:]
+
+def _argument_parser(have_bpy):
+	parser = argparse.ArgumentParser(prog='python -m WarMDLImport',
+		description="Convert WarCraft MDL/MDX files to .blend files (in Blender) or "
+			"to parsed models (.wmdc) and MDL files (anywhere).")
+	parser.add_argument('patterns', nargs='+', metavar='FILE',
+		help="model files, glob patterns or directories")
+	parser.add_argument('--format', choices=sorted(formats), default='blend' if have_bpy else 'wmdc',
+		help="what to write (default: %(default)s)")
+	parser.add_argument('--out', metavar='DIR',
+		help="directory of the outputs, by default they go next to the inputs")
+	parser.add_argument('--workers', type=int, default=0,
+		help="processes parsing the files, 0 for one per core")
+	parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+		help="don't read or fill the parse cache")
+	parser.add_argument('--parts', type=lambda text: set(text.upper().split(',')),
+		help="comma separated parts to read, out of {}".format(', '.join(_parts)))
+	parser.add_argument('--geosets', type=parse_indices, default=None,
+		help="indices of the geosets to read, like 0,2-4")
+	parser.add_argument('--recover', action='store_true',
+		help="skip the blocks which can't be parsed instead of failing the file, "
+			"they are listed as warnings")
+	parser.add_argument('--no-weld', dest='weld', action='store_false',
+		help="keep the vertices split like in the file (.blend only)")
+	parser.add_argument('--json', metavar='FILE',
+		help="also write the per file timings and counters to this file")
+	parser.add_argument('--log-level', default='WARNING',
+		choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'))
+	return parser
+
+# Prints one line per file and the totals.
+# @param results: One dict per file, see main().
+def print_summary(results, seconds, out=sys.stdout):
+	width = max([len(r['file']) for r in results] + [4])
+	out.write("{:<{w}} {:>9} {:>9} {:>10} {:>8}  {}\n".format("file", "parse s", "write s", "vertices",
+		"problems", "result", w=width))
+	for r in results:
+		out.write("{file:<{w}} {parse_seconds:>9.3f} {write_seconds:>9.3f} {vertices:>10} {1:>8}  {0}\n".format(
+			r['error'] or r['output'], len(r['diagnostics']), w=width, **r))
+	failed = sum(1 for r in results if r['error'])
+	out.write("{} of {} files converted in {:.3f} seconds\n".format(len(results) - failed, len(results), seconds))
+
+# Runs the command line and returns the exit status: 0 if all files were
+# converted, 1 if some failed, 2 for bad arguments (argparse exits right away
+# for the ones it finds).
+# @param argv: The arguments, by default the ones after Blender's.
+def main(argv=None):
+	have_bpy = _have_bpy()
+	parser = _argument_parser(have_bpy)
+	args = parser.parse_args(_script_args() if argv is None else argv)
+	# On the package's logger, so importer.py doesn't add another handler.
+	handler = logging.StreamHandler()
+	handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+	package_log = logging.getLogger(__package__)
+	package_log.addHandler(handler)
+	package_log.setLevel(args.log_level)
+
+	if args.format == 'blend' and not have_bpy:
+		parser.error(".blend files can only be written by Blender, run this with "
+			"blender --background --python {} -- ...".format(
+			os.path.join(os.path.dirname(os.path.abspath(__file__)), '__main__.py')))
+	if args.parts is not None and not args.parts <= set(_parts):
+		parser.error("unknown parts {}".format(', '.join(sorted(args.parts - set(_parts)))))
+	filepaths = expand(args.patterns)
+	if not filepaths:
+		parser.error("no .mdl or .mdx files match {}".format(' '.join(args.patterns)))
+	try:
+		outputs = output_paths(filepaths, args.out, formats[args.format])
+	except ValueError as e:
+		parser.error(str(e))
+	if args.out and not os.path.isdir(args.out):
+		os.makedirs(args.out)
+
+	if args.format == 'blend':
+		converter = BlendConverter(args.weld)
+		if args.workers != 1:
+			from .importer import _python_workers
+			_python_workers()
+	else:
+		converter = ModelConverter(args.format)
+
+	start_time = time.time()
+	total = Stats()
+	results = []
+	for filepath, model, error, stats in parse_many(filepaths, args.workers or None,
+			args.use_cache, args.parts, args.geosets, total, args.recover):
+		result = {'file': filepath, 'output': outputs[filepath], 'error': None,
+			'parse_seconds': stats.timers.get('parse', (0, 0.0))[1], 'write_seconds': 0.0,
+			'vertices': 0, 'diagnostics': []}
+		results.append(result)
+		if model is None:
+			log.error("Couldn't parse %s:\n%s", filepath, error)
+			result['error'] = error.strip().splitlines()[-1]
+			continue
+		for diagnostic in model.diagnostics:
+			log.warning("%s: %s", filepath, format_diagnostic(diagnostic))
+		result['diagnostics'] = model.diagnostics
+		result['vertices'] = sum(len(g.vertices) // 3 for g in model.geosets)
+		write_stats = Stats()
+		start = time.perf_counter()
+		try:
+			converter.convert(model, filepath, outputs[filepath], write_stats)
+		except Exception as e:
+			log.exception("Couldn't convert %s", filepath)
+			result['error'] = "{}: {}".format(type(e).__name__, e)
+		result['write_seconds'] = time.perf_counter() - start
+		total.merge(write_stats)
+		total.add_time('write', result['write_seconds'])
+	seconds = time.time() - start_time
+
+	print_summary(results, seconds)
+	if args.json:
+		report = {
+			'version': '.'.join(str(n) for n in bl_info['version']),
+			'format': args.format,
+			'workers': args.workers,
+			'seconds': seconds,
+			'files': results,
+			'stats': total.as_dict(),
+			}
+		with open(args.json, 'w') as outfile:
+			json.dump(report, outfile, indent=1, sort_keys=True)
+	return 1 if any(r['error'] for r in results) else 0
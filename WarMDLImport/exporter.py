@@ -0,0 +1,230 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# The Blender half of the exporter: fills a Model (see model.py) from the scene,
+# the reverse of importer.py, which writer.py then writes as MDL.
+
+import bpy
+import logging
+import os
+import time
+from array import array
+
+from bpy_extras.io_utils import ExportHelper
+from bpy.props import BoolProperty, StringProperty
+from mathutils import Vector
+
+from .model import Geoset, Model
+from .stats import Stats
+from .writer import write_file
+
+log = logging.getLogger(__name__)
+
+# Copies an attribute of all items of a collection into a new array, in one
+# foreach_get() call.
+# @param collection: E.g. mesh.vertices.
+# @param attr: E.g. 'co'.
+# @param width: Numbers per item.
+# @param typecode: 'f' or 'i'.
+def _get(collection, attr, width, typecode='f'):
+	a = array(typecode, bytes(4 * len(collection) * width))
+	collection.foreach_get(attr, a)
+	return a
+
+# This class gathers the meshes, armature and camera of the scene into a
+# Model. All its state belongs to the instance, one instance per export.
+class DataExporter:
+	# @param stats: The Stats object to collect the timings and counts of the
+	# export in, a new one if None.
+	def __init__(self, stats=None):
+		self.stats = stats or Stats()
+
+	# Exports the scene to an MDL file and returns the Stats.
+	# @param filepath: Path of the .mdl file.
+	# @param use_selection: Only export the selected objects.
+	def run(self, filepath, context, use_selection=False):
+		start_time = time.time()
+		objects = context.selected_objects if use_selection else context.scene.objects
+		with self.stats.timer('export.gather'):
+			model = self.gather(context.scene, objects)
+		model.info['name'] = os.path.splitext(os.path.basename(filepath))[0]
+		with self.stats.timer('export.write'):
+			write_file(model, filepath, self.stats)
+		log.info("Exported %s after %.3f seconds", filepath, time.time() - start_time)
+		self.stats.log_summary(logging.DEBUG)
+		return self.stats
+
+	# Returns a Model with the meshes, the first armature and the first (or
+	# the active) camera of objects.
+	def gather(self, scene, objects):
+		model = Model()
+		meshes = [obj for obj in objects if obj.type == 'MESH']
+		armatures = [obj for obj in objects if obj.type == 'ARMATURE']
+		cameras = [obj for obj in objects if obj.type == 'CAMERA']
+
+		bone_ids = {}
+		if armatures:
+			if len(armatures) > 1:
+				log.warning("Only the armature %s is exported", armatures[0].name)
+			with self.stats.timer('export.armature'):
+				bone_ids = self.gather_skeleton(model, armatures[0])
+		if meshes and not bone_ids:
+			# Every vertex has to belong to a bone.
+			model.skeleton.append({'type': 'Bone', 'bone_name': 'Root', 'id': 0,
+				'pivot_point': [0.0, 0.0, 0.0]})
+
+		for obj in meshes:
+			with self.stats.timer('export.geoset'):
+				self.gather_geoset(model, scene, obj, bone_ids)
+
+		if cameras:
+			camera = scene.camera if scene.camera in cameras else cameras[0]
+			self.gather_camera(model, camera)
+
+		# The extent of the whole model.
+		if model.extents:
+			lo = [min(e['MinimumExtent'][c] for e in model.extents) for c in range(3)]
+			hi = [max(e['MaximumExtent'][c] for e in model.extents) for c in range(3)]
+			model.info['MinimumExtent'] = lo
+			model.info['MaximumExtent'] = hi
+			model.info['BoundsRadius'] = 20 * sum((b - a) ** 2 for a, b in zip(lo, hi)) ** 0.5 / 2
+		model.nodes = dict((node['id'], node) for node in model.skeleton)
+		return model
+
+	# Adds one Bone per bone of an armature, at its head in world space.
+	# Returns the ObjectIds by bone name.
+	def gather_skeleton(self, model, armat_obj):
+		matrix = armat_obj.matrix_world
+		bones = armat_obj.data.bones
+		bone_ids = dict((bone.name, i) for i, bone in enumerate(bones))
+		for i, bone in enumerate(bones):
+			node = {'type': 'Bone', 'bone_name': bone.name, 'id': i,
+				'pivot_point': list(matrix * bone.head_local)}
+			if bone.parent is not None:
+				node['parent'] = bone_ids[bone.parent.name]
+			model.skeleton.append(node)
+		self.stats.count('bones', len(bones))
+		return bone_ids
+
+	# Adds the geoset of a mesh object, in world space and without modifiers.
+	# Faces are triangulated. MDL has one UV and normal per vertex, so the
+	# vertices are split wherever their face corners have different UVs or
+	# (split) normals, see Geoset.split().
+	# @param bone_ids: The ObjectIds by bone name, which vertex groups refer
+	# to.
+	def gather_geoset(self, model, scene, obj, bone_ids):
+		mesh = obj.to_mesh(scene, False, 'PREVIEW')
+		try:
+			mesh.transform(obj.matrix_world)
+			mesh.calc_normals_split()
+			mesh_geoset = Geoset()
+			mesh_geoset.vertices = _get(mesh.vertices, 'co', 3)
+			self.gather_groups(mesh_geoset, mesh, obj, bone_ids)
+
+			# Triangles go in as they are, other polygons become fans.
+			loop_verts = _get(mesh.loops, 'vertex_index', 1, 'i')
+			starts = _get(mesh.polygons, 'loop_start', 1, 'i')
+			totals = _get(mesh.polygons, 'loop_total', 1, 'i')
+			if all(n == 3 for n in totals):
+				triangles = array('I', range(len(loop_verts)))
+			else:
+				triangles = array('I')
+				for start, n in zip(starts, totals):
+					for k in range(1, n - 1):
+						triangles.extend((start, start + k, start + k + 1))
+
+			loop_uvs = None
+			if mesh.uv_layers.active is not None:
+				loop_uvs = _get(mesh.uv_layers.active.data, 'uv', 2)
+			loop_normals = _get(mesh.loops, 'normal', 3)
+			with self.stats.timer('export.split'):
+				geoset = mesh_geoset.split(loop_verts, loop_uvs, loop_normals, triangles)
+			model.geosets.append(geoset)
+			count = len(geoset.vertices) // 3
+			self.stats.count('vertices', count)
+			self.stats.count('vertices.split', count - len(mesh.vertices))
+			self.stats.count('faces', len(geoset.faces) // 3)
+		finally:
+			bpy.data.meshes.remove(mesh)
+
+		vertices = geoset.vertices
+		if count:
+			lo = [min(vertices[c::3]) for c in range(3)]
+			hi = [max(vertices[c::3]) for c in range(3)]
+		else:
+			lo = hi = [0.0, 0.0, 0.0]
+		model.extents.append({'MinimumExtent': lo, 'MaximumExtent': hi,
+			'BoundsRadius': sum((b - a) ** 2 for a, b in zip(lo, hi)) ** 0.5 / 2})
+
+	# Builds the matrix groups of a geoset from the vertex groups named after
+	# bones: each distinct set of bones a vertex is weighted to becomes a
+	# group. Vertices without any go to the first bone.
+	def gather_groups(self, geoset, mesh, obj, bone_ids):
+		group_bones = dict((vg.index, bone_ids[vg.name]) for vg in obj.vertex_groups
+			if vg.name in bone_ids)
+		groups = {}
+		vgroups = geoset.vgroups
+		for v in mesh.vertices:
+			key = tuple(sorted(set(group_bones[g.group] for g in v.groups
+				if g.group in group_bones and g.weight > 0))) or (0,)
+			if key not in groups:
+				groups[key] = len(groups)
+				geoset.matrices.extend(key)
+				geoset.matrix_sizes.append(len(key))
+			vgroups.append(groups[key])
+
+	# Sets the camera of the model. Its target is the object it tracks, if it
+	# has a Track To constraint like the imported ones, or a point ahead of
+	# it.
+	def gather_camera(self, model, cam_obj):
+		matrix = cam_obj.matrix_world
+		position = matrix.to_translation()
+		target = None
+		for constraint in cam_obj.constraints:
+			if constraint.type == 'TRACK_TO' and constraint.target is not None:
+				target = constraint.target.matrix_world.to_translation()
+		if target is None:
+			# Cameras look down their -Z axis.
+			target = matrix * Vector((0.0, 0.0, -10.0))
+		model.camera.update({
+			'name': cam_obj.name,
+			'Position': list(position),
+			'Target': list(target),
+			'FieldOfView': cam_obj.data.angle,
+			'FarClip': cam_obj.data.clip_end,
+			'NearClip': cam_obj.data.clip_start,
+			})
+
+# This is the export operator.
+class ExportWarMDL(bpy.types.Operator, ExportHelper):
+	'''Export to WarCraft MDL model format (.mdl)'''
+	bl_idname = "export_mesh.warmdl"
+	bl_label = "WarCraft MDL (.mdl)"
+
+	filename_ext = ".mdl"
+
+	filter_glob = StringProperty(
+			default="*.mdl",
+			options={'HIDDEN'}
+			)
+
+	use_selection = BoolProperty(
+			name="Selection Only",
+			description="Export only the selected objects",
+			default=False,
+			)
+
+	def execute(self, context):
+		DataExporter().run(self.filepath, context, self.use_selection)
+		return {'FINISHED'}
+
+def menu_func_write(self, context):
+	self.layout.operator(ExportWarMDL.bl_idname, text="WarCraft MDL (.mdl)")
@@ -0,0 +1,954 @@
+# Copyright (c) 2011 Thomas Glamsch
+# 
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# The Blender half of the importer: turns a parsed Model into Blender objects.
+
+import bpy
+import hashlib
+import logging
+import multiprocessing
+import os
+import pdb
+import sys
+import time
+from array import array
+
+from bpy_extras.io_utils import ImportHelper
+from mathutils import Matrix
+from bpy.props import BoolProperty, CollectionProperty, EnumProperty, IntProperty, StringProperty
+
+from .batch import extensions, find_models, parse_many
+from .cache import ParseCache
+from .model import format_diagnostic
+from .parser import parse_file, parse_indices
+from .stats import Stats
+
+dbg = False
+
+log = logging.getLogger(__name__)
+
+# Blender doesn't set up logging, so we print our messages ourselves.
+_package_log = logging.getLogger(__package__)
+if not _package_log.handlers:
+	_package_log.addHandler(logging.StreamHandler())
+	_package_log.setLevel(logging.INFO)
+
+# The node tracks and where they go on our bones. All bones point up (+Z),
+# so in bone space y and z are swapped and y is negated. For each Blender
+# component: the component of the MDL value and its sign. MDL quaternions
+# are x, y, z, w, Blender's are w, x, y, z.
+_track_paths = (
+	('Translation', 'location', (0, 2, 1), (1, 1, -1)),
+	('Rotation', 'rotation_quaternion', (3, 0, 2, 1), (1, 1, 1, -1)),
+	('Scaling', 'scale', (0, 2, 1), (1, 1, 1)),
+	)
+
+# Blender's interpolation for each MDL interpolation type.
+_interpolations = {
+	'DontInterp': 'CONSTANT',
+	'Linear': 'LINEAR',
+	'Hermite': 'BEZIER',
+	'Bezier': 'BEZIER',
+	}
+
+# The meshes built in this Blender session by content key (see
+# DataImporter.mesh_key()), so identical geosets of later imports share them.
+# Only names are kept, meshes which were deleted or renamed are built again.
+_meshes = {}
+
+# The same for images by resolved path (see find_image()) and materials by
+# content key, so textures many models use, like team color or a shared
+# atlas, are loaded only once per session.
+_images = {}
+_materials = {}
+
+# Image formats Blender reads, tried in place of the BLPs of the game, which
+# it can't.
+_image_exts = ('.tga', '.png', '.dds', '.bmp', '.jpg')
+
+# How many directories above the model's the game paths of its textures are
+# looked up in, for models extracted with their folders.
+_image_parents = 3
+
+# The textures the game puts in for the replaceable ones. Other replaceable
+# textures, like cliffs and trees, depend on the map and get no image.
+_replaceable_images = {
+	1: 'ReplaceableTextures\\TeamColor\\TeamColor00.blp',
+	2: 'ReplaceableTextures\\TeamGlow\\TeamGlow00.blp',
+	}
+
+# How the filter modes of the first layer of a material make it transparent,
+# and how the filter modes of the other layers blend onto the ones below.
+_transparent_modes = ('Transparent', 'Blend', 'AddAlpha')
+_blend_types = {
+	'Additive': 'ADD',
+	'AddAlpha': 'ADD',
+	'Modulate': 'MULTIPLY',
+	'Modulate2x': 'MULTIPLY',
+	}
+
+# Smallest half size of a proxy box, so flat geosets stay visible.
+_min_half = 0.01
+
+# Workers have to run Python, not another Blender, on platforms which start
+# them from scratch.
+def _python_workers():
+	if sys.platform == 'win32' and hasattr(bpy.app, 'binary_path_python'):
+		multiprocessing.set_executable(bpy.app.binary_path_python)
+
+# Splits a flat array into rows of width numbers, for the functions which
+# want a sequence of vectors.
+def _rows(flat, width):
+	return [flat[k:k + width] for k in range(0, len(flat) - width + 1, width)]
+
+# Interleaves two equally long sequences into a flat x, y, x, y, ... array.
+def _pairs(xs, ys):
+	out = array('f', bytes(8 * len(xs)))
+	out[0::2] = array('f', xs)
+	out[1::2] = array('f', ys)
+	return out
+
+# Returns the file an image path of a model refers to, or None if there is
+# none. The path is relative to the game's data, with backslashes, and
+# usually names a BLP, so the same name with the extensions in _image_exts is
+# looked for in the model's directory and the ones above it.
+# @param image: The Image of a texture.
+# @param directory: The directory of the model.
+def find_image(image, directory):
+	path = image.replace('\\', os.sep).replace('/', os.sep)
+	stem, ext = os.path.splitext(path)
+	names = [stem + e for e in _image_exts]
+	if ext.lower() in _image_exts:
+		names.insert(0, path)
+	for name in list(names):
+		names.append(os.path.basename(name))
+	for level in range(_image_parents + 1):
+		for name in names:
+			candidate = os.path.join(directory, name)
+			if os.path.isfile(candidate):
+				return os.path.normcase(os.path.realpath(candidate))
+		parent = os.path.dirname(directory)
+		if parent == directory:
+			break
+		directory = parent
+	return None
+
+# The parts to parse for proxies: the extents instead of the geometry.
+def _proxy_parts(parts):
+	parts = set(parts or ('GEOMETRY', 'SKELETON', 'ANIMATION', 'MATERIALS', 'CAMERA'))
+	parts.discard('GEOMETRY')
+	parts.add('BOUNDS')
+	return parts
+
+# Returns the center and the half size of a geoset's box, from its extent or,
+# if the file has none, from the model's.
+# @param i: Index of the geoset in model.extents.
+def _proxy_box(model, i):
+	for extent in (model.extents[i], model.info):
+		lo = extent.get('MinimumExtent')
+		hi = extent.get('MaximumExtent')
+		if lo and hi and lo != hi:
+			center = [(a + b) / 2 for a, b in zip(lo, hi)]
+			return center, [max((b - a) / 2, _min_half) for a, b in zip(lo, hi)]
+	# The model's BoundsRadius isn't scaled down, the geosets' ones are.
+	radius = model.extents[i].get('BoundsRadius') or model.info.get('BoundsRadius', 20.0) / 20
+	return [0.0, 0.0, 0.0], [max(radius, _min_half)] * 3
+
+# The world matrix of an untouched proxy: the unit cube of an empty moved and
+# scaled onto the box.
+# @param box: The center followed by the half size.
+def _box_matrix(box):
+	m = Matrix.Translation(box[0:3])
+	for axis in range(3):
+		m[axis][axis] = box[3 + axis]
+	return m
+
+# This class parses the file and uses the gathered data to construct the model
+# in Blender. All its state belongs to the instance, one instance per import.
+class DataImporter:
+	# @param stats: The Stats object to collect the timings and counts of the
+	# import in, a new one if None.
+	# @param instance_meshes: Whether geosets identical to one imported
+	# before share its mesh instead of building a new one.
+	# @param proxies: Whether to only parse the extents of the geosets and
+	# build a box in place of each, see load_proxies().
+	# @param weld: Whether to merge the vertices the file splits at seams,
+	# see Geoset.weld().
+	def __init__(self, stats=None, instance_meshes=True, proxies=False, weld=True):
+		self.stats = stats or Stats()
+		self.instance_meshes = instance_meshes
+		self.proxies = proxies
+		self.weld = weld
+		# Whether the models are parsed with recover, set by run().
+		self.recover = False
+		# The parts of the Model being built.
+		self.mgr = None
+		self.skel_info = []
+		self.model_info = {}
+		self.camera_info = {}
+	
+	# Imports a single file and returns the Stats.
+	# @param filepath: Path of the .mdl or .mdx file.
+	# @param use_cache: Whether to look up and store the parsed model in the
+	# parse cache.
+	# @param parts, geosets: Only import parts of the file, see
+	# parser.parse_file().
+	# @param workers: Number of worker processes parsing the geosets of an
+	# MDL file, None for one per core if the file is big enough (see
+	# parser.parallel_bytes).
+	# @param recover: Whether to skip the blocks which can't be parsed
+	# instead of failing, see parser.parse_file().
+	def run(self, filepath, context, use_cache=True, parts=None, geosets=None, workers=1, recover=False):
+		start_time = time.time()
+		self.recover = recover
+		log.info("Opening %s...", filepath)
+		if self.proxies:
+			parts = _proxy_parts(parts)
+		if workers != 1:
+			_python_workers()
+		with self.stats.timer('parse'):
+			if use_cache:
+				model = ParseCache().parse_file(filepath, parts, geosets, self.stats, workers, recover)
+			else:
+				model = parse_file(filepath, parts, geosets, self.stats, workers, recover)
+		self.build(model, context, filepath)
+		log.info("Script finished after %.3f seconds", time.time() - start_time)
+		self.stats.log_summary(logging.DEBUG)
+		return self.stats
+	
+	# Imports many files and returns the Stats. They are parsed in parallel by
+	# worker processes, while the models that are already parsed get built
+	# here.
+	# @param filepaths: Paths of the .mdl and .mdx files.
+	# @param workers: Number of worker processes, None for one per core.
+	# @param use_cache: Whether to go through the parse cache.
+	# @param parts, geosets: Only import parts of the files, see
+	# parser.parse_file().
+	# @param recover: See run().
+	def run_many(self, filepaths, context, workers=None, use_cache=True, parts=None, geosets=None,
+			recover=False):
+		start_time = time.time()
+		self.recover = recover
+		_python_workers()
+		if self.proxies:
+			parts = _proxy_parts(parts)
+		failed = []
+		for filepath, model, error, file_stats in parse_many(filepaths, workers, use_cache, parts, geosets,
+				self.stats, recover):
+			if model is None:
+				log.error("Couldn't parse %s:\n%s", filepath, error)
+				failed.append(filepath)
+				continue
+			log.info("Building %s...", filepath)
+			self.build(model, context, filepath)
+		self.stats.count('files', len(filepaths) - len(failed))
+		self.stats.count('files.failed', len(failed))
+		log.info("Imported %d of %d files after %.3f seconds",
+			len(filepaths) - len(failed), len(filepaths), time.time() - start_time)
+		self.stats.log_summary(logging.DEBUG)
+		return self.stats
+	
+	# Constructs the Blender objects of a parsed Model.
+	# @param filepath: The file the model was parsed from, which proxies
+	# load their geometry from later.
+	def build(self, model, context, filepath=None):
+		for diagnostic in model.diagnostics:
+			log.warning("%s: %s", filepath or model.info.get('name'), format_diagnostic(diagnostic))
+		self.stats.count('diagnostics', len(model.diagnostics))
+		self.mgr = model.geosets
+		self.skel_info = model.skeleton
+		self.model_info = model.info
+		self.camera_info = model.camera
+		
+		#Dem bones, unless only other parts were imported
+		armat_obj = None
+		bone_names = {}
+		stats = self.stats
+		if self.skel_info:
+			with stats.timer('build.armature'):
+				armat_obj, bone_names = self.build_skeleton()
+			if self.proxies:
+				# The geosets loaded later need the bone names Blender chose.
+				armat_obj['warmdl_bones'] = dict((str(k), v) for k, v in bone_names.items())
+			with stats.timer('build.animation'):
+				self.build_animation(model, armat_obj, bone_names)
+		
+		materials = []
+		if model.materials and not self.proxies:
+			with stats.timer('build.materials'):
+				materials = self.build_materials(model, os.path.dirname(os.path.abspath(filepath or '')))
+		
+		if dbg: pdb.set_trace()
+		# Construct an own object for each geoset.
+		for i, geoset in enumerate(self.mgr):
+			if self.proxies:
+				with stats.timer('build.proxy'):
+					self.build_proxy(i, model, filepath, armat_obj)
+				continue
+			with stats.timer('build.geoset'):
+				self.build_geoset(i, geoset, armat_obj, bone_names, self.geoset_material(model, i, materials))
+		
+		#Camera creation
+		if self.camera_info:
+			with stats.timer('build.camera'):
+				self.build_camera()
+	
+	# Creates the armature with one bone per node. Returns its object and the
+	# bone names by ObjectId.
+	def build_skeleton(self):
+		#Make an armature
+		armat = bpy.data.armatures.new('skeleton')
+		armat_obj = bpy.data.objects.new('skeleton', armat)
+		armat_obj.show_x_ray = True
+		armat_obj.draw_type = 'WIRE'
+		armat.show_names = True
+		bpy.context.scene.objects.link(armat_obj)
+		bpy.context.scene.objects.active = armat_obj
+		#armat_obj.select = True
+		
+		bpy.ops.object.mode_set(mode='EDIT')
+		
+		#Create our bones, one for each node. Blender renames duplicate
+		#names, so we remember the names it actually used for the vertex
+		#groups, by ObjectId.
+		bones = {}
+		bone_names = {}
+		for d in self.skel_info:
+			bone = armat.edit_bones.new(d['bone_name'])
+			bone.head = (d['pivot_point'][0],d['pivot_point'][1],d['pivot_point'][2])
+			#if 'parent' in d:
+				#bone.tail = (d['pivot_point'][0],d['pivot_point'][1],d['pivot_point'][2])
+				#bone.use_connect = True;
+			#else:
+			bone.tail = (d['pivot_point'][0],d['pivot_point'][1],d['pivot_point'][2] + 0.25)
+			if 'id' in d:
+				bones[d['id']] = bone
+				bone_names[d['id']] = bone.name
+		
+		#Parent them based on id info
+		for d in self.skel_info:
+			if 'id' in d and d.get('parent') in bones and d['parent'] != d['id']:
+				bones[d['id']].parent = bones[d['parent']]
+		
+		bpy.ops.object.mode_set(mode='OBJECT')
+		self.stats.count('bones', len(self.skel_info))
+		return armat_obj, bone_names
+	
+	# Puts the node animations of all sequences into one action, on one
+	# timeline like in the file, with a marker at the start of each
+	# sequence.
+	# @param armat_obj: The armature object.
+	# @param bone_names: The bone names by ObjectId.
+	def build_animation(self, model, armat_obj, bone_names):
+		scene = bpy.context.scene
+		# Milliseconds to frames
+		scale = scene.render.fps / scene.render.fps_base / 1000.0
+		for seq in model.sequences:
+			scene.timeline_markers.new(seq['name'], frame=int(round(seq['start'] * scale)))
+		if model.sequences:
+			scene.frame_start = int(round(min(seq['start'] for seq in model.sequences) * scale))
+			scene.frame_end = int(round(max(seq['end'] for seq in model.sequences) * scale))
+		
+		action = None
+		for d in self.skel_info:
+			if d.get('id') not in bone_names:
+				continue
+			name = bone_names[d['id']]
+			for key, path, components, signs in _track_paths:
+				track = d.get(key)
+				if not track or not track['times']:
+					continue
+				if action is None:
+					action = bpy.data.actions.new(self.model_info['name'])
+					armat_obj.animation_data_create().action = action
+				data_path = 'pose.bones["{}"].{}'.format(name.replace('"', '\\"'), path)
+				for index in range(len(components)):
+					fcurve = action.fcurves.new(data_path, index=index, action_group=name)
+					self.build_fcurve(fcurve, track, components[index], signs[index], scale)
+					# Tracks in a global sequence loop on their own.
+					if track['global_seq'] >= 0:
+						fcurve.modifiers.new('CYCLES')
+	
+	# Fills an F-Curve with one component of a track. The keys are added all
+	# at once and their coordinates and handles go in through foreach_set().
+	# @param component: The index of the component in the track's values.
+	# @param sign: 1 or -1 to negate the values.
+	# @param scale: Factor from milliseconds to frames.
+	def build_fcurve(self, fcurve, track, component, sign, scale):
+		width = track['width']
+		frames = [time * scale for time in track['times']]
+		values = [sign * v for v in track['values'][component::width]]
+		count = len(frames)
+		self.stats.count('keyframes', count)
+		points = fcurve.keyframe_points
+		points.add(count)
+		points.foreach_set('co', _pairs(frames, values))
+		interpolation = _interpolations[track['interpolation']]
+		
+		if interpolation == 'BEZIER':
+			in_tans = [sign * v for v in track['in_tans'][component::width]]
+			out_tans = [sign * v for v in track['out_tans'][component::width]]
+			# Handles a third of the way to the neighbouring keys.
+			steps = [(b - a) / 3 for a, b in zip(frames, frames[1:])] or [1.0]
+			left = [steps[max(k - 1, 0)] for k in range(count)]
+			right = [steps[min(k, len(steps) - 1)] for k in range(count)]
+			if track['interpolation'] == 'Hermite':
+				# Hermite tangents are slopes over a whole segment.
+				in_values = [v - tan / 3 for v, tan in zip(values, in_tans)]
+				out_values = [v + tan / 3 for v, tan in zip(values, out_tans)]
+			else:
+				# Bezier tangents are the control points themselves.
+				in_values, out_values = in_tans, out_tans
+			points.foreach_set('handle_left', _pairs([f - step for f, step in zip(frames, left)], in_values))
+			points.foreach_set('handle_right', _pairs([f + step for f, step in zip(frames, right)], out_values))
+		
+		# Enums can't go through foreach_set().
+		for point in points:
+			point.interpolation = interpolation
+			if interpolation == 'BEZIER':
+				point.handle_left_type = point.handle_right_type = 'FREE'
+		fcurve.update()
+	
+	# Returns the image of a texture, loading it unless this session has
+	# already, or None if the texture has no image.
+	# @param texture: One of model.textures.
+	# @param directory: The directory of the model.
+	def load_image(self, texture, directory):
+		name = texture.get('Image') or _replaceable_images.get(texture.get('ReplaceableId'))
+		if not name:
+			return None
+		path = find_image(name, directory)
+		# Images which aren't there are shared by their game path, as
+		# placeholders which can be pointed at the right file later.
+		key = path or name.lower()
+		image = bpy.data.images.get(_images.get(key, ''))
+		if image is not None and image.get('warmdl_path') == key:
+			self.stats.count('images.reused')
+			return image
+		image = None
+		if path is not None:
+			try:
+				image = bpy.data.images.load(path)
+				self.stats.count('images.loaded')
+			except RuntimeError as e:
+				log.warning("Can't load the texture %s: %s", path, e)
+		else:
+			log.warning("Can't find the texture %s", name)
+		if image is None:
+			image = bpy.data.images.new(os.path.basename(name.replace('\\', '/')), 1, 1)
+			image.source = 'FILE'
+			image.filepath = name.replace('\\', '/')
+			self.stats.count('images.missing')
+		image['warmdl_path'] = key
+		_images[key] = image.name
+		return image
+	
+	# Creates the Blender materials of a model, or reuses the ones of an
+	# identical material imported before. Each layer becomes an image texture
+	# slot mapped with the UVs, blended like the layer's filter mode. Returns
+	# the materials in the order of model.materials.
+	# @param directory: The directory of the model, where its textures are
+	# looked up.
+	def build_materials(self, model, directory):
+		images = [self.load_image(texture, directory) for texture in model.textures]
+		materials = []
+		for j, material in enumerate(model.materials):
+			layers = [(layer, images[layer['TextureID']] if 0 <= layer['TextureID'] < len(images) else None)
+				for layer in material['layers']]
+			h = hashlib.sha1(repr(material.get('PriorityPlane', 0)).encode('ascii'))
+			for layer, image in layers:
+				h.update(repr(sorted(layer.items())).encode('utf-8'))
+				h.update((image.name if image is not None else '').encode('utf-8'))
+			key = h.hexdigest()
+			mat = bpy.data.materials.get(_materials.get(key, ''))
+			if mat is not None and mat.get('warmdl_key') == key:
+				self.stats.count('materials.reused')
+				materials.append(mat)
+				continue
+			mat = bpy.data.materials.new("{name}Material{j}".format(name=self.model_info['name'], j=j))
+			for k, (layer, image) in enumerate(layers):
+				mode = layer['FilterMode']
+				if k == 0:
+					if mode in _transparent_modes or layer['Alpha'] < 1.0:
+						mat.use_transparency = True
+						mat.alpha = 0.0
+					mat.use_shadeless = bool(layer.get('Unshaded'))
+				if image is None:
+					continue
+				texture = bpy.data.textures.new(image.name, 'IMAGE')
+				texture.image = image
+				slot = mat.texture_slots.add()
+				slot.texture = texture
+				slot.texture_coords = 'UV'
+				slot.blend_type = _blend_types.get(mode, 'MIX')
+				if mat.use_transparency and k == 0:
+					slot.use_map_alpha = True
+					slot.alpha_factor = layer['Alpha']
+			mat['warmdl_key'] = key
+			_materials[key] = mat.name
+			self.stats.count('materials')
+			materials.append(mat)
+		return materials
+	
+	# Returns the Blender material of geoset i, or None if it has none.
+	# @param materials: The materials from build_materials().
+	def geoset_material(self, model, i, materials):
+		if i < len(model.material_ids) and 0 <= model.material_ids[i] < len(materials):
+			return materials[model.material_ids[i]]
+		return None
+	
+	# Creates the object of a single geoset and returns it.
+	# @param i: Index of the geoset, used in the names.
+	# @param armat_obj: The armature object deforming the mesh, or None if
+	# the skeleton wasn't imported.
+	# @param bone_names: The bone names by ObjectId.
+	# @param material: The Blender material of the geoset, or None.
+	def build_geoset(self, i, geoset, armat_obj, bone_names, material=None):
+		groups = geoset.groups()
+		# Reuse the mesh of an identical geoset if there is one.
+		mesh = key = None
+		if self.instance_meshes:
+			key = self.mesh_key(geoset, groups, bone_names)
+			mesh = bpy.data.meshes.get(_meshes.get(key, ''))
+			if mesh is not None and mesh.get('warmdl_key') != key:
+				mesh = None
+		reused = mesh is not None
+		if not reused:
+			mesh = bpy.data.meshes.new("{name}{i}Mesh".format(name=self.model_info['name'], i=i))
+		
+		# Create an object and link it to the scene.
+		obj = bpy.data.objects.new("{name}{i}".format(name=self.model_info['name'], i=i), mesh)
+		obj.location = (0.0, 0.0, 0.0)
+		bpy.context.scene.objects.link(obj)
+		
+		if reused:
+			self.stats.count('meshes.reused')
+			# The weights are stored in the mesh, the object only needs the
+			# vertex groups, in the same order.
+			for j in range(len(groups)):
+				for s in groups[j]:
+					if s in bone_names and obj.vertex_groups.get(bone_names[s]) is None:
+						obj.vertex_groups.new(bone_names[s])
+		else:
+			self.build_mesh(i, geoset, mesh, obj, groups, bone_names)
+			if key is not None:
+				mesh['warmdl_key'] = key
+				_meshes[key] = mesh.name
+		
+		# A shared mesh keeps the material it was built with, objects whose
+		# geoset uses another one override it.
+		if material is not None:
+			if not mesh.materials:
+				mesh.materials.append(material)
+			elif mesh.materials[0] != material:
+				obj.material_slots[0].link = 'OBJECT'
+				obj.material_slots[0].material = material
+		
+		# Let the armature deform the mesh through these vertex groups.
+		# Unlike hooks this needs no operators and no edit mode.
+		if groups and armat_obj is not None:
+			modifier = obj.modifiers.new(name='Armature', type='ARMATURE')
+			modifier.object = armat_obj
+			modifier.use_vertex_groups = True
+		
+		if dbg: pdb.set_trace()
+		return obj
+	
+	# Returns the content key of a geoset's mesh: the hash of its geometry
+	# and of the bones its vertex groups are named after.
+	# @param groups: The geoset's matrix groups.
+	# @param bone_names: The bone names by ObjectId.
+	def mesh_key(self, geoset, groups, bone_names):
+		h = hashlib.sha1(geoset.digest().encode('ascii'))
+		h.update(b'welded' if self.weld else b'split')
+		for group in groups:
+			h.update('\0'.join(bone_names.get(s, '') for s in group).encode('utf-8'))
+			h.update(b'\1')
+		return h.hexdigest()
+	
+	# Fills a new mesh with the geometry, weights, UVs and normals of a
+	# geoset.
+	# @param obj: The object of the mesh, which gets the vertex groups.
+	def build_mesh(self, i, geoset, mesh, obj, groups, bone_names):
+		# The UVs and normals go to the face corners, so the vertices only
+		# split for them in the file can be merged.
+		if self.weld:
+			with self.stats.timer('build.weld'):
+				welded, loop_uvs, loop_normals = geoset.weld()
+			self.stats.count('vertices.welded', (len(geoset.vertices) - len(welded.vertices)) // 3)
+			geoset = welded
+		else:
+			loop_uvs = loop_normals = None
+			if len(geoset.tvertices) * 3 == len(geoset.vertices) * 2:
+				loop_uvs = geoset.loop_uvs()
+		
+		# Construct the mesh from the gathered vertex and face data. All
+		# data goes in through foreach_set(), which copies whole arrays at
+		# once instead of going through RNA for every single element.
+		VertLength = len(geoset.vertices) // 3
+		FaceLength = len(geoset.faces) // 3
+		mesh.vertices.add(VertLength)
+		mesh.vertices.foreach_set('co', geoset.vertices)
+		mesh.loops.add(FaceLength * 3)
+		mesh.loops.foreach_set('vertex_index', array('i', geoset.faces))
+		mesh.polygons.add(FaceLength)
+		mesh.polygons.foreach_set('loop_start', array('i', range(0, FaceLength * 3, 3)))
+		mesh.polygons.foreach_set('loop_total', array('i', [3]) * FaceLength)
+		mesh.polygons.foreach_set('use_smooth', [True] * FaceLength)
+		self.stats.count('vertices', VertLength)
+		self.stats.count('faces', FaceLength)
+		
+		# Create one vertex group per bone. The vertices of a matrix group
+		# are shared evenly between its bones.
+		with self.stats.timer('build.vertex_groups'):
+			members = geoset.group_members()
+			stray = len(geoset.vgroups) - sum(len(m) for m in members)
+			if stray and self.recover:
+				log.warning("%d vertices of geoset %d are in matrix groups which don't exist", stray, i)
+			for j in range(len(groups)):
+				for s in groups[j]:
+					if s not in bone_names:
+						continue
+					name = bone_names[s]
+					vg = obj.vertex_groups.get(name) or obj.vertex_groups.new(name)
+					vg.add(members[j], 1.0 / len(groups[j]), 'ADD')
+		
+		# Create the UV layout, one UV per face corner.
+		if loop_uvs is not None:
+			mesh.uv_textures.new(name="uvtex{}".format(i))
+			mesh.uv_layers[-1].data.foreach_set('uv', loop_uvs)
+		
+		#Update the mesh
+		mesh.validate()
+		mesh.update(calc_edges=True)
+		
+		# Use the normals from the file instead of calculated ones, per face
+		# corner where the vertices were welded. If validate() removed faces
+		# the corners don't match anymore, then the welded vertices keep
+		# the normal of their first copy.
+		if loop_normals is not None and len(loop_normals) == 3 * len(mesh.loops):
+			mesh.use_auto_smooth = True
+			mesh.normals_split_custom_set(_rows(loop_normals, 3))
+		elif len(geoset.normals) == len(geoset.vertices):
+			mesh.use_auto_smooth = True
+			mesh.normals_split_custom_set_from_vertices(_rows(geoset.normals, 3))
+	
+	# Creates an empty drawn as the box of a geoset, which knows where to load
+	# the geoset from.
+	# @param i: Index of the geoset.
+	# @param filepath: The file of the model.
+	# @param armat_obj: The armature object, or None.
+	def build_proxy(self, i, model, filepath, armat_obj):
+		center, half = _proxy_box(model, i)
+		obj = bpy.data.objects.new("{name}{i}".format(name=self.model_info['name'], i=i), None)
+		obj.empty_draw_type = 'CUBE'
+		obj.location = center
+		obj.scale = half
+		bpy.context.scene.objects.link(obj)
+		obj['warmdl_path'] = os.path.abspath(filepath)
+		obj['warmdl_geoset'] = i
+		obj['warmdl_box'] = center + half
+		if armat_obj is not None:
+			obj['warmdl_armature'] = armat_obj.name
+		self.stats.count('proxies')
+	
+	# Replaces the proxies of one file by their geosets. Each geoset ends up
+	# wherever its proxy was moved, rotated or scaled to.
+	# @param filepath: The file the proxies were imported from.
+	# @param proxies: The proxy objects of that file.
+	# @param use_cache: Whether to go through the parse cache.
+	def load_proxies(self, filepath, proxies, use_cache=True):
+		indices = sorted(set(proxy['warmdl_geoset'] for proxy in proxies))
+		parts = ['GEOMETRY', 'MATERIALS']
+		with self.stats.timer('parse'):
+			if use_cache:
+				model = ParseCache().parse_file(filepath, parts, indices, self.stats)
+			else:
+				model = parse_file(filepath, parts, indices, self.stats)
+		self.model_info = model.info
+		materials = []
+		if model.materials:
+			with self.stats.timer('build.materials'):
+				materials = self.build_materials(model, os.path.dirname(filepath))
+		geosets = dict(zip(indices, model.geosets))
+		material_ids = dict(zip(indices, model.material_ids))
+		scene = bpy.context.scene
+		for proxy in proxies:
+			i = proxy['warmdl_geoset']
+			if i not in geosets:
+				log.warning("%s has no geoset %d", filepath, i)
+				continue
+			armat_obj = bpy.data.objects.get(proxy.get('warmdl_armature', ''))
+			bone_names = {}
+			if armat_obj is not None:
+				bone_names = dict((int(k), v) for k, v in armat_obj.get('warmdl_bones', {}).items())
+			material_id = material_ids.get(i, -1)
+			material = materials[material_id] if 0 <= material_id < len(materials) else None
+			with self.stats.timer('build.geoset'):
+				obj = self.build_geoset(i, geosets[i], armat_obj, bone_names, material)
+			obj.matrix_world = proxy.matrix_world * _box_matrix(proxy['warmdl_box']).inverted()
+			name = proxy.name
+			scene.objects.unlink(proxy)
+			bpy.data.objects.remove(proxy)
+			obj.name = name
+	
+	# Creates the camera and its target.
+	def build_camera(self):
+		cam_data = bpy.data.cameras.new(self.camera_info['name'])
+		cam_obj = bpy.data.objects.new(self.camera_info['name'], cam_data)
+		bpy.context.scene.objects.link(cam_obj)
+		cam_obj.location = self.camera_info['Position']
+		bpy.context.scene.objects.active = cam_obj
+		bpy.context.scene.camera = cam_obj
+		
+		cam_data.angle = self.camera_info['FieldOfView']
+		cam_data.clip_end = self.camera_info['FarClip']
+		cam_data.clip_start = self.camera_info['NearClip']
+		
+		targ_obj = bpy.data.objects.new(self.camera_info['name'] + "Target", object_data=None)
+		bpy.context.scene.objects.link(targ_obj)
+		targ_obj.location = self.camera_info['Target']
+		
+		cam_obj.constraints.new("TRACK_TO")
+		cam_obj.constraints["Track To"].target=targ_obj
+		cam_obj.constraints["Track To"].up_axis='UP_Y'
+		cam_obj.constraints["Track To"].track_axis='TRACK_NEGATIVE_Z'
+			
+		if 'Rotation' in self.camera_info:
+			cam_obj.rotation = self.camera_info['Rotation']
+			
+	
+
+# This is the import operator.
+class ImportWarMDL(bpy.types.Operator, ImportHelper):
+	'''Import from WarCraft MDL/MDX model format (.mdl/.mdx)'''
+	bl_idname = "import_mesh.warmdl"
+	bl_label = "WarCraft MDL/MDX (.mdl/.mdx)"
+	
+	filename_ext = ".mdl"
+	
+	filter_glob = StringProperty(
+			default="*.mdl;*.mdx",
+			options={'HIDDEN'}
+			)
+	
+	files = CollectionProperty(
+			type=bpy.types.OperatorFileListElement,
+			options={'HIDDEN', 'SKIP_SAVE'},
+			)
+	
+	directory = StringProperty(
+			subtype='DIR_PATH',
+			options={'HIDDEN', 'SKIP_SAVE'},
+			)
+	
+	import_directory = BoolProperty(
+			name="Whole Directory",
+			description="Import all .mdl and .mdx files in the current directory",
+			default=False,
+			)
+	
+	workers = IntProperty(
+			name="Parser Processes",
+			description="Number of processes parsing the files, or the geosets of a single MDL file. "
+				"0 uses one per core, but parses small single files in one go",
+			default=0,
+			min=0,
+			)
+	
+	use_cache = BoolProperty(
+			name="Use Parse Cache",
+			description="Reuse the parsed data of files which were imported before",
+			default=True,
+			)
+	
+	parts = EnumProperty(
+			name="Import",
+			description="Parts of the model to import, everything else is skipped while parsing",
+			items=(('GEOMETRY', "Geometry", "The geosets"),
+				('SKELETON', "Skeleton", "The bones and other nodes"),
+				('ANIMATION', "Animation", "The sequences and node animations, needs the skeleton"),
+				('MATERIALS', "Materials", "The textures and materials of the geosets"),
+				('CAMERA', "Camera", "The camera")),
+			options={'ENUM_FLAG'},
+			default={'GEOMETRY', 'SKELETON', 'ANIMATION', 'MATERIALS', 'CAMERA'},
+			)
+	
+	geoset_indices = StringProperty(
+			name="Geosets",
+			description="Indices of the geosets to import, like 0,2-4. Empty imports all of them",
+			default="",
+			)
+	
+	log_level = EnumProperty(
+			name="Log Level",
+			description="How much to print to the console",
+			items=(('WARNING', "Warnings", "Only problems"),
+				('INFO', "Info", "One line per file"),
+				('DEBUG', "Debug", "Every parser state and a timing summary")),
+			default='INFO',
+			)
+	
+	report_path = StringProperty(
+			name="Timing Report",
+			description="Write the timers and counters of the import to this JSON file, if set",
+			subtype='FILE_PATH',
+			default="",
+			)
+	
+	instance_meshes = BoolProperty(
+			name="Share Identical Meshes",
+			description="Geosets identical to one imported before in this session use its mesh instead of a copy",
+			default=True,
+			)
+	
+	clear_cache = BoolProperty(
+			name="Clear Parse Cache",
+			description="Delete all cached parse results before importing",
+			default=False,
+			)
+	
+	weld = BoolProperty(
+			name="Weld Vertices",
+			description="Merge the vertices the file splits at UV seams and hard edges, keeping the UVs and normals",
+			default=True,
+			)
+	
+	recover = BoolProperty(
+			name="Skip Broken Blocks",
+			description="Import what can be read of a damaged file, skipping the blocks which can't be "
+				"parsed (they are listed in the console), instead of giving up on the whole file",
+			default=True,
+			)
+	
+	proxies = BoolProperty(
+			name="Geometry as Proxies",
+			description="Only read the bounds of the geosets and import a box for each, "
+				"which loads the real geometry later (Load WarCraft MDL/MDX Proxies)",
+			default=False,
+			)
+	
+	@classmethod
+	def poll(cls, context):
+		return True
+	
+	def execute(self, context):
+		try:
+			geosets = parse_indices(self.geoset_indices)
+		except ValueError as e:
+			self.report({'ERROR'}, str(e))
+			return {'CANCELLED'}
+		parts = set(self.parts)
+		if parts == {'GEOMETRY', 'SKELETON', 'ANIMATION', 'MATERIALS', 'CAMERA'}:
+			parts = None
+		_package_log.setLevel(self.log_level)
+		if self.clear_cache:
+			ParseCache().clear()
+		di = DataImporter(instance_meshes=self.instance_meshes, proxies=self.proxies, weld=self.weld)
+		if self.import_directory:
+			filepaths = find_models(self.directory or os.path.dirname(self.filepath))
+		else:
+			filepaths = [os.path.join(self.directory, f.name) for f in self.files
+				if f.name.lower().endswith(extensions)]
+		if len(filepaths) > 1:
+			stats = di.run_many(filepaths, context, workers=self.workers or None,
+				use_cache=self.use_cache, parts=parts, geosets=geosets, recover=self.recover)
+		else:
+			stats = di.run(filepaths[0] if filepaths else self.filepath, context,
+				use_cache=self.use_cache, parts=parts, geosets=geosets, workers=self.workers or None,
+				recover=self.recover)
+		if stats.counters.get('diagnostics'):
+			self.report({'WARNING'}, "{} problems while parsing, see the console".format(
+				stats.counters['diagnostics']))
+		if self.report_path:
+			stats.write_json(bpy.path.abspath(self.report_path))
+		return {'FINISHED'}
+
+# Replaces proxies imported with 'Geometry as Proxies' by the real geosets.
+# Run from the UI it works in the background, one file per timer event, so
+# the scene stays usable meanwhile. Run from a script it loads everything at
+# once.
+class LoadWarMDLProxies(bpy.types.Operator):
+	'''Load the geometry of WarCraft MDL/MDX proxies'''
+	bl_idname = "object.warmdl_load_proxies"
+	bl_label = "Load WarCraft MDL/MDX Proxies"
+	
+	selected_only = BoolProperty(
+			name="Selected Only",
+			description="Only load the selected proxies",
+			default=False,
+			)
+	
+	use_cache = BoolProperty(
+			name="Use Parse Cache",
+			description="Reuse the parsed data of files which were imported before",
+			default=True,
+			)
+	
+	# Returns the proxies in the scene as (filepath, object names) pairs, one
+	# per file.
+	def find_proxies(self, context):
+		objects = context.selected_objects if self.selected_only else context.scene.objects
+		files = {}
+		for obj in objects:
+			if 'warmdl_path' in obj:
+				files.setdefault(obj['warmdl_path'], []).append(obj.name)
+		return sorted(files.items())
+	
+	# Loads the proxies of one file, names which are gone by now are skipped.
+	def load(self, filepath, names):
+		proxies = [bpy.data.objects[name] for name in names if name in bpy.data.objects]
+		if not proxies:
+			return
+		log.info("Loading %d proxies of %s...", len(proxies), filepath)
+		try:
+			self.importer.load_proxies(filepath, proxies, self.use_cache)
+		except Exception as e:
+			log.error("Couldn't load %s: %s", filepath, e)
+			self.report({'WARNING'}, "Couldn't load {}".format(filepath))
+	
+	def execute(self, context):
+		self.importer = DataImporter()
+		for filepath, names in self.find_proxies(context):
+			self.load(filepath, names)
+		self.importer.stats.log_summary(logging.DEBUG)
+		return {'FINISHED'}
+	
+	def invoke(self, context, event):
+		self.jobs = self.find_proxies(context)
+		if not self.jobs:
+			self.report({'INFO'}, "No proxies to load")
+			return {'CANCELLED'}
+		self.importer = DataImporter()
+		wm = context.window_manager
+		self.timer = wm.event_timer_add(0.01, context.window)
+		wm.modal_handler_add(self)
+		return {'RUNNING_MODAL'}
+	
+	def modal(self, context, event):
+		if event.type == 'ESC':
+			self.finish(context)
+			return {'CANCELLED'}
+		if event.type != 'TIMER':
+			return {'PASS_THROUGH'}
+		filepath, names = self.jobs.pop(0)
+		self.load(filepath, names)
+		if self.jobs:
+			return {'RUNNING_MODAL'}
+		self.finish(context)
+		return {'FINISHED'}
+	
+	def finish(self, context):
+		context.window_manager.event_timer_remove(self.timer)
+		self.importer.stats.log_summary(logging.DEBUG)
+
+def menu_func_export(self, context):
+	self.layout.operator(ImportWarMDL.bl_idname, text="WarCraft MDL/MDX (.mdl/.mdx)")
@@ -0,0 +1,146 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# A byte offset index of the blocks of an MDL file. The file is memory mapped
+# and only its top level and the insides of the Geosets are tokenized, all
+# other blocks are jumped over by matching their braces. Single blocks can then
+# be decoded and parsed on their own, in any order:
+#
+#   with open('Footman.mdl', 'rb') as infile:
+#       data = map_file(infile)
+#       index = BlockIndex(data)
+#       text = index.text(index.find('Geoset', 2))
+
+import mmap
+import re
+
+from .lexer import _token_re, block_end
+
+_token_bytes_re = re.compile(_token_re.pattern.encode('ascii'), re.VERBOSE)
+
+# Keywords whose blocks get an index of their own blocks, too.
+_indexed_children = ('Geoset',)
+
+# One block: the keyword starting it and its byte offsets in the file.
+class Block:
+	__slots__ = ('keyword', 'ordinal', 'start', 'body', 'end', 'children', 'closed')
+
+	# @param keyword: The keyword starting the block, like 'Geoset'.
+	# @param ordinal: The number of blocks with the same keyword before this
+	# one, on the same level.
+	# @param start: Offset of the keyword.
+	# @param body: Offset right after the opening brace.
+	# @param end: Offset right after the closing brace, the end of the file
+	# if the block isn't closed.
+	# @param closed: False if the file ends inside the block.
+	def __init__(self, keyword, ordinal, start, body, end, closed=True):
+		self.keyword = keyword
+		self.ordinal = ordinal
+		self.start = start
+		self.body = body
+		self.end = end
+		self.closed = closed
+		# The blocks inside, for the keywords in _indexed_children.
+		self.children = []
+
+	def __repr__(self):
+		return "<Block {} {} {}-{}>".format(self.keyword, self.ordinal, self.start, self.end)
+
+# Indexes the blocks on one level, from pos up to the closing brace of the
+# block around them or the end of the data. Returns the blocks and the offset
+# after that closing brace, -1 if nested and the data ends first.
+# @param data: The file contents, bytes or a mmap.
+# @param nested: False for the top level, where stray closing braces are
+# ignored like the parser does.
+def _scan(data, pos, nested=False):
+	blocks = []
+	ordinals = {}
+	keyword = start = None
+	end = len(data)
+	while True:
+		m = _token_bytes_re.search(data, pos)
+		if m is None:
+			return blocks, -1 if nested else end
+		pos = m.end()
+		kind = m.lastgroup
+		if kind == 'ident':
+			# The first word of a statement is its keyword.
+			if keyword is None:
+				keyword, start = m.group(kind).decode('ascii'), m.start()
+		elif kind == 'punct':
+			value = m.group(kind)
+			if value == b'{':
+				# Scanning the children finds the end of the block as well.
+				if keyword in _indexed_children:
+					children, close = _scan(data, pos, True)
+				else:
+					children, close = [], block_end(data, pos)
+				closed = close >= 0
+				if not closed:
+					close = end
+				if keyword is not None:
+					block = Block(keyword, ordinals.get(keyword, 0), start, pos, close, closed)
+					block.children = children
+					ordinals[keyword] = block.ordinal + 1
+					blocks.append(block)
+				pos = close
+				keyword = None
+			elif value == b'}' and nested:
+				return blocks, pos
+			else:
+				keyword = None
+
+# The index of one MDL file.
+class BlockIndex:
+	# @param data: The file contents, bytes or a mmap (see map_file()).
+	# @param blocks: The top level blocks if they are known already, e.g.
+	# from the index of another process. Otherwise the data is scanned.
+	def __init__(self, data, blocks=None):
+		self.data = data
+		# The top level blocks in file order.
+		self.blocks = _scan(data, 0)[0] if blocks is None else blocks
+		self._by_keyword = {}
+		for block in self.blocks:
+			self._by_keyword.setdefault(block.keyword, []).append(block)
+
+	# Returns all top level blocks with a keyword, in file order.
+	def all(self, keyword):
+		return self._by_keyword.get(keyword, [])
+
+	# Returns a top level block by keyword and ordinal, None if there is none.
+	def find(self, keyword, ordinal=0):
+		blocks = self.all(keyword)
+		return blocks[ordinal] if 0 <= ordinal < len(blocks) else None
+
+	# Returns the text of a block, from its keyword to its closing brace.
+	def text(self, block):
+		return self.data[block.start:block.end].decode('utf-8', 'replace')
+
+	# Returns the ends of a block and its indexed children by the offsets of
+	# their bodies, both relative to the block's text. See TokenStream.
+	def ends(self, block):
+		ends = dict((child.body - block.start, child.end - block.start) for child in block.children)
+		ends[block.body - block.start] = block.end - block.start
+		return ends
+
+	# Returns the line number a block starts at. This has to count all lines
+	# before it, so it is meant for error messages.
+	def line(self, block):
+		return self.data[:block.start].count(b'\n') + 1
+
+# Memory maps a file for reading. Empty files can't be mapped, they give
+# empty bytes instead.
+# @param infile: A binary mode file object.
+def map_file(infile):
+	try:
+		return mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+	except ValueError:
+		return b''
@@ -0,0 +1,230 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# The MDL tokenizer. The whole file is scanned once with a single regular
+# expression; the handlers only ever see (kind, value) tokens and never touch
+# the raw lines, so the line layout of a file doesn't matter.
+
+import re
+import warnings
+from array import array
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Token kinds. Braces, commas and colons use the character itself as kind.
+IDENT = 'ident'
+NUMBER = 'number'
+STRING = 'string'
+EOF = 'eof'
+
+_token_re = re.compile(r'''
+	(?P<comment>//[^\n]*)
+	| "(?P<string>[^"]*)"
+	| (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+	| (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+	| (?P<punct>[{},:])
+	''', re.VERBOSE)
+
+# Braces, and the comments and strings whose braces don't count.
+_brace_re = re.compile(r'//[^\n]*|"[^"]*"|[{}]')
+
+# Raised for files which don't parse, with the line (None if unknown) and the
+# reason apart, so a recovering parse can report them (see
+# parser.ModelParser).
+class ParseError(Exception):
+	# @param reason: What is wrong, like "expected 'number', got ','".
+	# @param line: The line number in the file.
+	def __init__(self, reason, line=None):
+		Exception.__init__(self, reason if line is None else "Line {}: {}".format(line, reason))
+		self.reason = reason
+		self.line = line
+
+# Matches the rest of a block (up to and including its closing brace) if it
+# nests at most two more blocks deep, which covers all blocks of numbers. The
+# unrolled loops never backtrack, so this is a single scan in C. Comments and
+# strings aren't known to it, see _block_end().
+_row = r'\{[^{}]*\}'
+_rows = r'\{[^{}]*(?:' + _row + r'[^{}]*)*\}'
+_block_end_re = re.compile(r'[^{}]*(?:' + _rows + r'[^{}]*)*\}')
+
+# The same for bytes, e.g. a memory mapped file (see index.py).
+_brace_bytes_re = re.compile(_brace_re.pattern.encode('ascii'))
+_block_end_bytes_re = re.compile(_block_end_re.pattern.encode('ascii'))
+
+# Returns the offset right after the closing brace of the block that starts
+# (after its opening brace) at pos, or -1 if it is never closed. Deeper nested
+# blocks are taken apart into sub-blocks which _block_end_re can match.
+# @param text: A str, or bytes or anything else with the buffer interface.
+def block_end(text, pos):
+	if isinstance(text, str):
+		return _block_end(text, pos, _block_end_re, _brace_re, '/', '"')
+	return _block_end(text, pos, _block_end_bytes_re, _brace_bytes_re, b'/', b'"')
+
+def _block_end(text, pos, block_end_re, brace_re, slash, quote):
+	m = block_end_re.match(text, pos)
+	# Blocks of numbers have no comments or strings. Blocks which do are
+	# matched brace by brace, skipping the braces in them.
+	if m and text.find(slash, pos, m.end()) < 0 and text.find(quote, pos, m.end()) < 0:
+		return m.end()
+	while True:
+		m = brace_re.search(text, pos)
+		if m is None:
+			return -1
+		elif m.group() in ('}', b'}'):
+			return m.end()
+		elif m.group() in ('{', b'{'):
+			pos = _block_end(text, m.end(), block_end_re, brace_re, slash, quote)
+			if pos < 0:
+				return -1
+		else:
+			pos = m.end()
+
+# Braces and commas inside a block of numbers.
+_separator_table = str.maketrans('{},', '   ')
+
+# Converts the text of a block of numbers (as returned by
+# TokenStream.raw_block()) into a flat array in one go. Returns a NumPy array if
+# NumPy is installed and an array.array otherwise. Raises a ValueError (or an
+# OverflowError without NumPy) for anything but numbers, and for indices which
+# don't fit.
+# @param text: Text containing the numbers, braces and commas are ignored.
+# @param typecode: 'f' for floats, 'I' for indices.
+def numbers(text, typecode='f'):
+	text = text.translate(_separator_table)
+	if numpy is not None:
+		with warnings.catch_warnings():
+			# Older NumPy versions only warn about text they can't read, and
+			# return the numbers before it.
+			warnings.simplefilter('error', DeprecationWarning)
+			try:
+				if typecode == 'f':
+					return numpy.fromstring(text, dtype=numpy.float32, sep=' ')
+				# Read wider, so negative and too big indices don't wrap.
+				flat = numpy.fromstring(text, dtype=numpy.int64, sep=' ')
+			except DeprecationWarning as e:
+				raise ValueError(str(e))
+		if len(flat) and (flat.min() < 0 or flat.max() > 0xffffffff):
+			raise ValueError("index out of range: {}".format(flat.min() if flat.min() < 0 else flat.max()))
+		return flat.astype(numpy.uint32)
+	if typecode == 'f':
+		return array('f', map(float, text.split()))
+	return array('I', map(int, text.split()))
+
+class TokenStream:
+	# @param text: The complete contents of an MDL file, or one block of it.
+	# @param first_line: The line number text starts at in the file, or a
+	# function returning it, which is only called for error messages.
+	# @param ends: Known ends of blocks, by the offsets right after their
+	# opening braces (see index.BlockIndex.ends()). These blocks are skipped
+	# without matching their braces.
+	def __init__(self, text, first_line=1, ends=None):
+		self.text = text
+		self.first_line = first_line
+		self.ends = ends or {}
+		self.seek(0)
+
+	# Continue tokenizing at a character offset of the text.
+	# @param pos: The offset to continue at.
+	def seek(self, pos):
+		self._matches = _token_re.finditer(self.text, pos)
+		self._peeked = None
+		self.pos = pos
+
+	# Returns the next token as (kind, value) and consumes it.
+	def next(self):
+		if self._peeked is not None:
+			token, self._peeked = self._peeked, None
+			return token
+		for m in self._matches:
+			kind = m.lastgroup
+			if kind == 'comment':
+				continue
+			self.pos = m.end()
+			value = m.group(kind)
+			if kind == 'punct':
+				return value, value
+			return kind, value
+		self.pos = len(self.text)
+		return EOF, ''
+
+	# Returns the next token without consuming it.
+	def peek(self):
+		if self._peeked is None:
+			self._peeked = self.next()
+		return self._peeked
+
+	# Consumes the next token and makes sure it is of the given kind.
+	# @param kind: One of the token kinds above or a punctuation character.
+	def expect(self, kind):
+		token = self.next()
+		if token[0] != kind:
+			raise ParseError("expected '{}', got '{}'".format(kind, token[1]), self.line())
+		return token[1]
+
+	# Consumes a token if it is of the given kind.
+	# @param kind: One of the token kinds above or a punctuation character.
+	def accept(self, kind):
+		if self.peek()[0] == kind:
+			return self.next()[1]
+		return None
+
+	# Reads a brace enclosed list of numbers, like { 1.0, 2.0, 3.0 }.
+	# @param conv: Function to convert each number with.
+	def vector(self, conv=float):
+		self.expect('{')
+		li = []
+		while True:
+			kind, value = self.next()
+			if kind == NUMBER:
+				li.append(conv(value))
+			elif kind == '}':
+				return li
+			elif kind != ',':
+				raise ParseError("unexpected '{}' in a vector".format(value), self.line())
+
+	# Returns the offset right after the closing brace of the block we're in,
+	# or -1 if the block is never closed. Nothing is tokenized.
+	def _block_end(self):
+		if self._peeked is not None:
+			raise Exception("Line {}: can't scan a block after peek()".format(self.line()))
+		end = self.ends.get(self.pos)
+		if end is not None:
+			return end
+		return block_end(self.text, self.pos)
+
+	# Consumes everything up to and including the closing brace of a block
+	# whose opening brace has just been read (without peeking). This only
+	# matches braces, so it is the cheap way to skip blocks we don't need.
+	def skip_block(self):
+		end = self._block_end()
+		self.seek(end if end >= 0 else len(self.text))
+
+	# Returns the text inside a block whose opening brace has just been read
+	# (without peeking) and continues tokenizing after its closing brace. This
+	# is much faster than tokenizing big blocks of numbers one by one.
+	def raw_block(self):
+		start = self.pos
+		end = self._block_end()
+		if end < 0:
+			raise ParseError("block is never closed", self.line())
+		self.seek(end)
+		return self.text[start:end - 1]
+
+	# Returns the line number of the current position, for error messages.
+	# @param pos: An earlier position to return the line of instead.
+	def line(self, pos=None):
+		first_line = self.first_line
+		if callable(first_line):
+			first_line = first_line()
+		return self.text.count('\n', 0, self.pos if pos is None else pos) + first_line
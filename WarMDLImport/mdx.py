@@ -0,0 +1,492 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Reader for the binary MDX format. It fills the same Model as the MDL
+# handlers in parser.py, applying the same scaling and UV flip. The file is
+# memory-mapped and the vertex, normal, UV and face chunks are copied straight
+# into typed arrays, without decoding anything to text.
+#
+# An MDX file is 'MDLX' followed by chunks: a four byte tag, a uint32 size and
+# the chunk data. All numbers are little endian.
+
+import struct
+import sys
+import time
+from array import array
+
+from .index import map_file
+from .lexer import ParseError
+from .model import Geoset, Model, filter_modes, interpolations, layer_flags, new_track
+from .stats import Stats
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+_u32 = struct.Struct('<I')
+_tag_u32 = struct.Struct('<4sI')
+_node = struct.Struct('<I80sIII')
+_model = struct.Struct('<80s260s7fI')
+_camera = struct.Struct('<I80s3f3f3f')
+_sequence = struct.Struct('<80sIIfIfI7f')
+_track = struct.Struct('<4sIII')
+_extent = struct.Struct('<7f')
+_texture = struct.Struct('<I260sI')
+_material = struct.Struct('<III4sI')
+_layer = struct.Struct('<IIIIIIf')
+
+# Marks a missing ObjectId/GeosetId.
+NONE = 0xFFFFFFFF
+
+# Chunks that hold one node per entry and the MDL keyword of that node type.
+_node_chunks = {
+	b'BONE': 'Bone',
+	b'HELP': 'Helper',
+	b'ATCH': 'Attachment',
+	b'LITE': 'Light',
+	b'EVTS': 'EventObject',
+	b'CLID': 'CollisionShape',
+	b'PREM': 'ParticleEmitter',
+	b'PRE2': 'ParticleEmitter2',
+	b'RIBB': 'RibbonEmitter',
+	}
+
+# Node animation tracks: the MDL keyword and the number of values per key.
+_track_chunks = {
+	b'KGTR': ('Translation', 3),
+	b'KGRT': ('Rotation', 4),
+	b'KGSC': ('Scaling', 3),
+	}
+
+# Material layer tracks: the MDL keyword and the typecode of the values.
+_layer_tracks = {
+	b'KMTF': ('TextureID', 'I'),
+	b'KMTA': ('Alpha', 'f'),
+	}
+
+# Bytes per item of the geoset chunks, all but MATS and UVAS.
+_geoset_sizes = {
+	b'VRTX': 12,
+	b'NRMS': 12,
+	b'PTYP': 4,
+	b'PCNT': 4,
+	b'PVTX': 2,
+	b'GNDX': 1,
+	b'MTGC': 4,
+	b'UVBS': 8,
+	}
+
+# Decodes a NUL padded string.
+def _string(raw):
+	return raw.split(b'\0', 1)[0].decode('utf-8', 'replace')
+
+# Copies count items of the given type from a buffer into a new array.
+# @param view: A memoryview of the file.
+# @param offset: Byte offset of the first item.
+# @param typecode: The array typecode of the items in the file.
+# @param count: Number of items.
+def _array(view, offset, typecode, count):
+	a = array(typecode)
+	a.frombytes(view[offset:offset + count * a.itemsize])
+	if sys.byteorder == 'big':
+		a.byteswap()
+	return a
+
+# Like _array(), but for floats which are scaled on the way in.
+def _scaled(view, offset, count, factor):
+	if numpy is not None:
+		data = numpy.frombuffer(view, dtype='<f4', count=count, offset=offset) * numpy.float32(factor)
+		a = array('f')
+		a.frombytes(data.astype(numpy.float32).tobytes())
+		return a
+	return array('f', [n * factor for n in _array(view, offset, 'f', count)])
+
+# Returns the inclusive size at the start of a record, like a node or a
+# material. Raises a ParseError unless the record is at least minimum bytes
+# long and ends by end.
+# @param what: The kind of record, for the error message.
+def _record_size(view, offset, end, minimum, what):
+	size = _u32.unpack_from(view, offset)[0]
+	if size < minimum or offset + size > end:
+		raise ParseError("{} at offset {} has a size of {}".format(what, offset, size))
+	return size
+
+# Reads an extent (BoundsRadius, MinimumExtent, MaximumExtent) into a dict,
+# scaled like the vertices.
+def _read_extent(view, offset, extent):
+	fields = _extent.unpack_from(view, offset)
+	extent['BoundsRadius'] = fields[0]/20
+	extent['MinimumExtent'] = [n/20 for n in fields[1:4]]
+	extent['MaximumExtent'] = [n/20 for n in fields[4:7]]
+
+class MDXReader:
+	# @param data: The complete file contents, as any buffer object (bytes,
+	# mmap, ...).
+	# @param parts, geosets: Only read parts of the file, like
+	# parser.ModelParser.
+	# @param stats: A Stats object to time the chunks with.
+	# @param recover: Whether to skip the chunks, and single geosets, which
+	# can't be read, like parser.ModelParser. The diagnostics give the
+	# offset instead of a line.
+	def __init__(self, data, parts=None, geosets=None, stats=None, recover=False):
+		self.stats = stats or Stats()
+		self.recover = recover
+		self.view = memoryview(data)
+		self.model = Model()
+		self.handlers = {
+			b'VERS': self.version,
+			b'MODL': self.model_info,
+			}
+		if parts is None or 'GEOMETRY' in parts or 'BOUNDS' in parts:
+			self.handlers[b'GEOS'] = self.geosets
+		# With only 'BOUNDS' the geosets are read for their extents.
+		self.read_geometry = parts is None or 'GEOMETRY' in parts
+		if parts is None or 'SKELETON' in parts:
+			self.handlers[b'PIVT'] = self.pivots
+			for tag in _node_chunks:
+				self.handlers[tag] = self.nodes
+		self.read_animation = parts is None or 'ANIMATION' in parts
+		if self.read_animation:
+			self.handlers[b'SEQS'] = self.sequences
+			self.handlers[b'GLBS'] = self.global_sequences
+		if parts is None or 'CAMERA' in parts:
+			self.handlers[b'CAMS'] = self.cameras
+		if parts is None or 'MATERIALS' in parts:
+			self.handlers[b'TEXS'] = self.textures
+			self.handlers[b'MTLS'] = self.materials
+		self.geoset_filter = None if geosets is None else set(geosets)
+
+	# Reads all chunks and returns the Model.
+	def run(self):
+		view = self.view
+		stats = self.stats
+		stats.count('parse.bytes', len(view))
+		try:
+			if bytes(view[:4]) != b'MDLX':
+				raise ParseError("This is not an MDX file!")
+			offset = 4
+			while offset + 8 <= len(view):
+				tag, size = _tag_u32.unpack_from(view, offset)
+				offset += 8
+				handler = self.handlers.get(tag)
+				if offset + size > len(view):
+					reason = "the file ends inside this chunk, it may be cut off"
+					if not self.recover:
+						raise ParseError("{}: {}".format(tag.decode('ascii', 'replace'), reason))
+					self.skip(tag, 0, offset, reason, 'warning')
+				if handler:
+					start = time.perf_counter()
+					self.read_chunk(handler, tag, offset, offset + size)
+					stats.add_time('mdx.' + tag.decode('ascii', 'replace'), time.perf_counter() - start)
+				offset += size
+		finally:
+			view.release()
+		return self.model.finish(self.recover)
+
+	# Calls a chunk handler and returns whether it worked. When recovering,
+	# whatever a failing handler read is dropped.
+	# @param index: The number of the chunk among the ones of its kind,
+	# for the diagnostics.
+	def read_chunk(self, handler, tag, start, end, index=0):
+		if not self.recover:
+			handler(tag, start, end)
+			return True
+		state = self.model.mark()
+		try:
+			handler(tag, start, end)
+		except (ParseError, struct.error, ValueError, OverflowError, IndexError, KeyError,
+				AttributeError, TypeError) as e:
+			self.model.rollback(state)
+			reason = getattr(e, 'reason', None) or "{}: {}".format(type(e).__name__, e)
+			self.skip(tag, index, start, reason)
+			return False
+		return True
+
+	# Notes a chunk which couldn't be read, or only partly, in
+	# Model.diagnostics.
+	def skip(self, tag, index, offset, reason, severity='error'):
+		self.model.diagnostics.append({'severity': severity, 'block': tag.decode('ascii', 'replace'),
+			'index': index, 'line': None, 'offset': offset, 'reason': reason})
+		if severity == 'error':
+			self.stats.count('parse.skipped')
+
+	def version(self, tag, start, end):
+		self.model.version = _u32.unpack_from(self.view, start)[0]
+		if self.model.version == 800:
+			pass
+		elif self.recover:
+			self.skip(tag, 0, start, "Version {} is not supported, reading it like 800".format(
+				self.model.version), 'warning')
+		else:
+			raise ParseError("This MDX Version is not supported!")
+
+	def model_info(self, tag, start, end):
+		fields = _model.unpack_from(self.view, start)
+		self.model.info['name'] = _string(fields[0])
+		self.model.info['BoundsRadius'] = fields[2]
+		self.model.info['MinimumExtent'] = [n/20 for n in fields[3:6]]
+		self.model.info['MaximumExtent'] = [n/20 for n in fields[6:9]]
+		self.model.info['BlendTime'] = fields[9]
+
+	def sequences(self, tag, start, end):
+		for offset in range(start, end - _sequence.size + 1, _sequence.size):
+			fields = _sequence.unpack_from(self.view, offset)
+			self.model.sequences.append({'name': _string(fields[0]), 'start': fields[1],
+				'end': fields[2], 'MoveSpeed': fields[3], 'NonLooping': bool(fields[4] & 1),
+				'Rarity': fields[5]})
+
+	def global_sequences(self, tag, start, end):
+		self.model.global_sequences = _array(self.view, start, 'I', (end - start) // 4).tolist()
+
+	def pivots(self, tag, start, end):
+		flat = _scaled(self.view, start, (end - start) // 4, 1.0/20)
+		self.model.pivots = [flat[i:i+3].tolist() for i in range(0, len(flat) - 2, 3)]
+
+	def cameras(self, tag, start, end):
+		# Like the MDL importer, we only keep the first camera for now.
+		if self.model.camera:
+			return
+		fields = _camera.unpack_from(self.view, start)
+		camera = self.model.camera
+		camera['name'] = _string(fields[1])
+		camera['Position'] = [n/20 for n in fields[2:5]]
+		camera['FieldOfView'] = fields[5]
+		camera['FarClip'] = fields[6]/20
+		camera['NearClip'] = fields[7]/20
+		camera['Target'] = [n/20 for n in fields[8:11]]
+
+	def textures(self, tag, start, end):
+		for offset in range(start, end - _texture.size + 1, _texture.size):
+			replaceable, image, flags = _texture.unpack_from(self.view, offset)
+			texture = {'Image': _string(image), 'ReplaceableId': replaceable}
+			if flags & 1:
+				texture['WrapWidth'] = True
+			if flags & 2:
+				texture['WrapHeight'] = True
+			self.model.textures.append(texture)
+
+	def materials(self, tag, start, end):
+		view = self.view
+		offset = start
+		while offset < end:
+			size = _record_size(view, offset, end, _material.size, 'Material')
+			size, priority, flags, lays, count = _material.unpack_from(view, offset)
+			material = {'PriorityPlane': priority, 'layers': []}
+			self.model.materials.append(material)
+			layer_offset = offset + _material.size
+			for i in range(count):
+				material['layers'].append(self.layer(layer_offset, offset + size))
+				layer_offset += _u32.unpack_from(view, layer_offset)[0]
+			offset += size
+
+	# Reads the material layer at offset into a dict. Animated values keep
+	# their first key, like in the MDL parser.
+	# @param end: The end of the material.
+	def layer(self, offset, end):
+		view = self.view
+		_record_size(view, offset, end, _layer.size, 'Layer')
+		size, mode, shading, texture, anim, coord, alpha = _layer.unpack_from(view, offset)
+		layer = {'FilterMode': filter_modes[mode] if mode < len(filter_modes) else 'None',
+			'TextureID': texture, 'Alpha': alpha}
+		for name, bit in layer_flags:
+			if shading & bit:
+				layer[name] = True
+		end = offset + size
+		offset += _layer.size
+		while offset + _track.size <= end:
+			tag, count, interpolation, global_seq = _track.unpack_from(view, offset)
+			if tag not in _layer_tracks:
+				break
+			key, typecode = _layer_tracks[tag]
+			offset += _track.size
+			if count:
+				layer[key] = _array(view, offset + 4, typecode, 1)[0]
+			offset += count * 4 * (4 if interpolation > 1 else 2)
+		return layer
+
+	# Reads the common node header at offset and returns the node dict and
+	# the offset after the node (including its animation tracks).
+	# @param end: The end of the chunk or object the node is in.
+	def node(self, typename, offset, end):
+		_record_size(self.view, offset, end, _node.size, typename)
+		size, name, objectid, parent, flags = _node.unpack_from(self.view, offset)
+		node = {'type': typename, 'bone_name': _string(name), 'id': objectid}
+		if parent != NONE:
+			node['parent'] = parent
+		self.model.skeleton.append(node)
+		if self.read_animation:
+			self.tracks(node, offset + _node.size, offset + size)
+		return node, offset + size
+
+	# Reads the KGTR, KGRT and KGSC tracks of a node.
+	def tracks(self, node, offset, end):
+		view = self.view
+		while offset + _track.size <= end:
+			tag, count, interpolation, global_seq = _track.unpack_from(view, offset)
+			if tag not in _track_chunks:
+				break
+			key, width = _track_chunks[tag]
+			offset += _track.size
+			# Every key is the time, the value and for Hermite and Bezier
+			# tracks the two tangents, as 32 bit numbers.
+			stride = 1 + width * (3 if interpolation > 1 else 1)
+			flat = _array(view, offset, 'f', count * stride)
+			times = _array(view, offset, 'i', count * stride)[0::stride]
+			offset += count * stride * 4
+			node[key] = new_track(interpolations[interpolation],
+				-1 if global_seq == NONE else global_seq, width, flat, times,
+				1.0/20 if key == 'Translation' else 1.0)
+
+	def nodes(self, tag, start, end):
+		typename = _node_chunks[tag]
+		view = self.view
+		offset = start
+		while offset < end:
+			if tag == b'BONE':
+				node, offset = self.node(typename, offset, end)
+				gid = _u32.unpack_from(view, offset)[0]
+				node['gid'] = -1 if gid == NONE else gid
+				offset += 8
+			elif tag == b'HELP':
+				node, offset = self.node(typename, offset, end)
+			elif tag == b'EVTS':
+				node, offset = self.node(typename, offset, end)
+				# Optional KEVT track: tag, count, global sequence id, frames.
+				if bytes(view[offset:offset + 4]) == b'KEVT':
+					count = _u32.unpack_from(view, offset + 4)[0]
+					offset += 12 + 4 * count
+			elif tag == b'CLID':
+				node, offset = self.node(typename, offset, end)
+				shape = _u32.unpack_from(view, offset)[0]
+				offset += 4 + (12 if shape == 2 else 24)
+				if shape in (2, 3):
+					offset += 4
+			else:
+				# These start with their own inclusive size.
+				size = _record_size(view, offset, end, 4 + _node.size, typename)
+				self.node(typename, offset + 4, offset + size)
+				offset += size
+
+	def geosets(self, tag, start, end):
+		view = self.view
+		offset = start
+		index = 0
+		while offset < end:
+			size = _record_size(view, offset, end, 4, 'Geoset {}'.format(index))
+			if self.geoset_filter is None or index in self.geoset_filter:
+				# A broken geoset leaves an empty one behind, so the indices of
+				# the others stay the same.
+				if not self.read_chunk(self.geoset, b'GEOS', offset + 4, offset + size, index):
+					self.model.geosets.append(Geoset())
+					self.model.extents.append({})
+					self.model.material_ids.append(0)
+			offset += size
+			index += 1
+
+	def geoset(self, tag, offset, end):
+		view = self.view
+		geoset = self.model.geosets.new_geoset()
+		extent = {}
+		self.model.extents.append(extent)
+		self.model.material_ids.append(0)
+		if not self.read_geometry:
+			self.geoset_extent(offset, end, extent)
+			return
+		types = array('I')
+		counts = array('I')
+		indices = array('I')
+		while offset < end:
+			tag, count = _tag_u32.unpack_from(view, offset)
+			offset += 8
+			if tag == b'VRTX':
+				# Divide with 20 to scale the model down.
+				geoset.vertices = _scaled(view, offset, count * 3, 1.0/20)
+				offset += count * 12
+			elif tag == b'NRMS':
+				geoset.normals = _array(view, offset, 'f', count * 3)
+				offset += count * 12
+			elif tag == b'PTYP':
+				types = _array(view, offset, 'I', count)
+				offset += count * 4
+			elif tag == b'PCNT':
+				counts = _array(view, offset, 'I', count)
+				offset += count * 4
+			elif tag == b'PVTX':
+				indices = array('I', _array(view, offset, 'H', count))
+				offset += count * 2
+			elif tag == b'GNDX':
+				geoset.vgroups = array('I', view[offset:offset + count])
+				offset += count
+			elif tag == b'MTGC':
+				geoset.matrix_sizes = _array(view, offset, 'I', count)
+				offset += count * 4
+			elif tag == b'MATS':
+				geoset.matrices = _array(view, offset, 'I', count)
+				offset += count * 4
+				# MaterialID, SelectionGroup, SelectionFlags, the extent and
+				# the per sequence extents follow.
+				self.model.material_ids[-1] = _u32.unpack_from(view, offset)[0]
+				_read_extent(view, offset + 12, extent)
+				extents = _u32.unpack_from(view, offset + 40)[0]
+				offset += 44 + 28 * extents
+			elif tag == b'UVAS':
+				# count texture coordinate sets follow, we only use the first.
+				pass
+			elif tag == b'UVBS':
+				if not geoset.tvertices:
+					uvs = _array(view, offset, 'f', count * 2)
+					# MDX counts V from the top of the texture, Blender from
+					# the bottom.
+					uvs[1::2] = array('f', [1 - v for v in uvs[1::2]])
+					geoset.tvertices = uvs
+				offset += count * 8
+			else:
+				raise ParseError("Unknown geoset chunk {!r}".format(tag))
+
+		# Only triangles (primitive type 4) are supported.
+		if all(t == 4 for t in types):
+			geoset.faces = indices[:len(indices) - len(indices) % 3]
+		else:
+			first = 0
+			for t, n in zip(types, counts):
+				if t == 4:
+					geoset.faces.extend(indices[first:first + n - n % 3])
+				first += n
+
+	# Only reads the extent of a geoset, skipping over its arrays.
+	def geoset_extent(self, offset, end, extent):
+		view = self.view
+		while offset < end:
+			tag, count = _tag_u32.unpack_from(view, offset)
+			offset += 8
+			if tag == b'MATS':
+				offset += count * 4
+				self.model.material_ids[-1] = _u32.unpack_from(view, offset)[0]
+				_read_extent(view, offset + 12, extent)
+				extents = _u32.unpack_from(view, offset + 40)[0]
+				offset += 44 + 28 * extents
+			elif tag in _geoset_sizes:
+				offset += count * _geoset_sizes[tag]
+			elif tag != b'UVAS':
+				raise ParseError("Unknown geoset chunk {!r}".format(tag))
+
+# Parses an MDX file and returns its Model.
+# @param filepath: Path of the .mdx file.
+# @param parts, geosets, stats, recover: See MDXReader.
+def parse_file(filepath, parts=None, geosets=None, stats=None, recover=False):
+	with open(filepath, 'rb') as infile:
+		data = map_file(infile)
+		try:
+			return MDXReader(data, parts, geosets, stats, recover).run()
+		finally:
+			if hasattr(data, 'close'):
+				data.close()
@@ -0,0 +1,440 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# The in-memory representation of a parsed MDL file. Nothing in here depends on
+# Blender, so it can be used from plain Python as well.
+
+import hashlib
+from array import array
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Appends a flat block of numbers (an array.array or a NumPy array of the same
+# item type, as returned by lexer.numbers()) to one of the geoset buffers.
+# @param buf: The array.array to append to.
+# @param data: The numbers to append.
+def append_array(buf, data):
+	if isinstance(data, array):
+		buf.extend(data)
+	else:
+		buf.frombytes(numpy.asarray(data, dtype=buf.typecode).tobytes())
+
+# Interpolation types of animation tracks, in MDX order.
+interpolations = ('DontInterp', 'Linear', 'Hermite', 'Bezier')
+
+# Filter modes of material layers, in MDX order.
+filter_modes = ('None', 'Transparent', 'Blend', 'Additive', 'AddAlpha', 'Modulate', 'Modulate2x')
+
+# Shading flags of material layers and their bits in MDX files.
+layer_flags = (('Unshaded', 0x1), ('SphereEnvMap', 0x2), ('TwoSided', 0x10),
+	('Unfogged', 0x20), ('NoDepthTest', 0x40), ('NoDepthSet', 0x80))
+
+# Copies width numbers starting at start out of every stride numbers of flat.
+def _columns(flat, stride, start, width):
+	count = len(flat) // stride
+	out = array('f', bytes(4 * count * width))
+	for c in range(width):
+		out[c::width] = flat[start + c::stride]
+	return out
+
+# Returns the items of a flat array with width numbers per item at the given
+# indices, as a new flat array of the same type.
+# @param flat: An array.array.
+# @param indices: The item indices, an array.array or a NumPy array.
+def _gather(flat, indices, width):
+	if numpy is not None:
+		rows = numpy.frombuffer(flat, dtype=flat.typecode).reshape(-1, width)
+		out = array(flat.typecode)
+		out.frombytes(rows[numpy.asarray(indices, dtype=numpy.intp)].tobytes())
+		return out
+	out = array(flat.typecode, bytes(flat.itemsize * len(indices) * width))
+	for c in range(width):
+		out[c::width] = array(flat.typecode, map(flat[c::width].__getitem__, indices))
+	return out
+
+# Numbers the distinct rows of a 2D uint32 NumPy array in the order they
+# first appear. Returns the index of the first row of each and the number of
+# every row.
+def _unique_rows(rows):
+	keys = numpy.ascontiguousarray(rows).view(numpy.dtype((numpy.void, rows.shape[1] * 4))).ravel()
+	first, inverse = numpy.unique(keys, return_index=True, return_inverse=True)[1:]
+	# unique() sorts by key, the rows keep their order.
+	order = numpy.argsort(first)
+	rank = numpy.empty(len(order), dtype=numpy.uint32)
+	rank[order] = numpy.arange(len(order), dtype=numpy.uint32)
+	return first[order], rank[inverse.ravel()]
+
+# Builds an animation track from its keys. A track is a dict of
+#   interpolation: one of interpolations
+#   global_seq: index of the global sequence it loops in, -1 for none
+#   width: number of values per key (3, or 4 for rotations)
+#   times: the key times in milliseconds
+#   values, in_tans, out_tans: width numbers per key, the tangents are only
+#   filled for Hermite and Bezier tracks
+# @param flat: The keys one after another: time, value, InTan, OutTan. An
+# array.array of floats or a NumPy array as returned by lexer.numbers().
+# @param times: The key times, if they aren't to be taken from flat.
+# @param scale: Factor for the values and tangents.
+def new_track(interpolation, global_seq, width, flat, times=None, scale=1.0):
+	if not isinstance(flat, array):
+		data, flat = flat, array('f')
+		append_array(flat, data)
+	tangents = interpolation in ('Hermite', 'Bezier')
+	stride = 1 + width * (3 if tangents else 1)
+	if times is None:
+		times = array('i', map(int, flat[0::stride]))
+	track = {'interpolation': interpolation, 'global_seq': global_seq, 'width': width,
+		'times': times, 'values': _columns(flat, stride, 1, width),
+		'in_tans': array('f'), 'out_tans': array('f')}
+	if tangents:
+		track['in_tans'] = _columns(flat, stride, 1 + width, width)
+		track['out_tans'] = _columns(flat, stride, 1 + 2 * width, width)
+	if scale != 1.0:
+		for name in ('values', 'in_tans', 'out_tans'):
+			track[name] = array('f', [n * scale for n in track[name]])
+	return track
+
+# The geometry of a single geoset. Everything is stored in flat typed arrays,
+# which grow geometrically when appended to, instead of lists of small lists:
+#   vertices: x, y, z per vertex
+#   normals: x, y, z per vertex
+#   tvertices: u, v per vertex
+#   faces: three vertex indices per triangle
+#   vgroups: the matrix group index of each vertex
+#   matrices: the node ids of all matrix groups, one after another
+#   matrix_sizes: the number of node ids in each matrix group
+class Geoset:
+	__slots__ = ('vertices', 'normals', 'tvertices', 'faces', 'vgroups',
+		'matrices', 'matrix_sizes')
+
+	def __init__(self):
+		self.vertices = array('f')
+		self.normals = array('f')
+		self.tvertices = array('f')
+		self.faces = array('I')
+		self.vgroups = array('I')
+		self.matrices = array('I')
+		self.matrix_sizes = array('I')
+
+	# Returns the matrix groups as a list of node id lists.
+	def groups(self):
+		li = []
+		start = 0
+		for size in self.matrix_sizes:
+			li.append(self.matrices[start:start + size].tolist())
+			start += size
+		return li
+
+	# Returns the vertex indices belonging to each matrix group, built in a
+	# single pass over vgroups. Vertices of groups which don't exist are
+	# left out.
+	def group_members(self):
+		members = [array('I') for size in self.matrix_sizes]
+		count = len(members)
+		for v, g in enumerate(self.vgroups):
+			if g < count:
+				members[g].append(v)
+		return members
+
+	# Returns the UV coordinates of every face corner (loop) as a flat u, v
+	# array, in face order.
+	def loop_uvs(self):
+		if numpy is not None:
+			uvs = numpy.frombuffer(self.tvertices, dtype=numpy.float32).reshape(-1, 2)
+			return uvs[numpy.frombuffer(self.faces, dtype=numpy.uint32)].ravel()
+		uvs = self.tvertices
+		li = array('f')
+		for v in self.faces:
+			li.extend(uvs[2*v:2*v+2])
+		return li
+
+	# Merges the vertices MDL splits at UV seams and hard edges: vertices with
+	# bit for bit the same position and the same matrix group become one.
+	# Triangles which collapse doing so are dropped. Returns a new Geoset with
+	# the welded vertices, vgroups and faces (normals and tvertices are those
+	# of the first vertex of each weld), and the UVs and normals of the face
+	# corners (loops) of its faces as flat arrays, None if the geoset has no
+	# UVs or normals for all vertices. The matrix groups are shared.
+	def weld(self):
+		count = len(self.vertices) // 3
+		if len(self.vgroups) != count:
+			# Without a group for every vertex welding could mix weights.
+			welded, corners = self, self.faces
+		elif numpy is not None:
+			welded, corners = self._weld_numpy(count)
+		else:
+			welded, corners = self._weld_python(count)
+		loop_uvs = loop_normals = None
+		if len(self.tvertices) == 2 * count:
+			loop_uvs = _gather(self.tvertices, corners, 2)
+		if len(self.normals) == 3 * count:
+			loop_normals = _gather(self.normals, corners, 3)
+		return welded, loop_uvs, loop_normals
+
+	# Starts the welded Geoset of weld() with the vertices kept. If all of
+	# them are kept it shares the buffers of this one.
+	# @param kept: The index of the first vertex of each weld, in order.
+	def _welded(self, count, kept):
+		welded = Geoset()
+		for name, width in (('vertices', 3), ('normals', 3), ('tvertices', 2), ('vgroups', 1)):
+			buf = getattr(self, name)
+			if len(kept) == count:
+				setattr(welded, name, buf)
+			elif len(buf) == count * width:
+				setattr(welded, name, _gather(buf, kept, width))
+		welded.matrices = self.matrices
+		welded.matrix_sizes = self.matrix_sizes
+		return welded
+
+	# The weld of weld() with NumPy. Returns the welded Geoset and the old
+	# vertex indices of the faces kept.
+	def _weld_numpy(self, count):
+		rows = numpy.empty((count, 4), dtype=numpy.uint32)
+		rows[:, :3] = numpy.frombuffer(self.vertices, dtype=numpy.uint32, count=3 * count).reshape(-1, 3)
+		rows[:, 3] = numpy.frombuffer(self.vgroups, dtype=numpy.uint32)
+		kept, remap = _unique_rows(rows)
+		welded = self._welded(count, kept)
+		faces = numpy.frombuffer(self.faces, dtype=numpy.uint32).reshape(-1, 3)
+		new = remap[faces]
+		keep = (new[:, 0] != new[:, 1]) & (new[:, 1] != new[:, 2]) & (new[:, 0] != new[:, 2])
+		welded.faces = array('I', new[keep].tobytes())
+		return welded, faces[keep].ravel()
+
+	# The weld of weld() without NumPy.
+	def _weld_python(self, count):
+		data = self.vertices.tobytes()
+		vgroups = self.vgroups
+		keys = {}
+		remap = array('I', bytes(4 * count))
+		kept = array('I')
+		for v in range(count):
+			key = (data[12*v:12*v+12], vgroups[v])
+			w = keys.get(key)
+			if w is None:
+				w = keys[key] = len(kept)
+				kept.append(v)
+			remap[v] = w
+		welded = self._welded(count, kept)
+		faces = self.faces
+		corners = array('I')
+		for t in range(0, len(faces) - 2, 3):
+			a, b, c = remap[faces[t]], remap[faces[t + 1]], remap[faces[t + 2]]
+			if a != b and b != c and a != c:
+				welded.faces.extend((a, b, c))
+				corners.extend(faces[t:t + 3])
+		return welded, corners
+
+	# The reverse of weld(): returns a new Geoset with a vertex for every
+	# distinct combination of a vertex of this one and the UV and normal of
+	# a face corner (loop) using it. This one only needs the vertices, the
+	# vgroups and the matrix groups.
+	# @param loop_verts: The vertex of each loop.
+	# @param loop_uvs: u, v per loop, None for no UVs.
+	# @param loop_normals: x, y, z per loop.
+	# @param triangles: Three loop indices per triangle.
+	def split(self, loop_verts, loop_uvs, loop_normals, triangles):
+		count = len(loop_verts)
+		if loop_uvs is None:
+			loop_uvs = array('f', bytes(8 * count))
+		if numpy is not None:
+			rows = numpy.empty((count, 6), dtype=numpy.uint32)
+			rows[:, 0] = numpy.frombuffer(loop_verts, dtype=numpy.uint32)
+			rows[:, 1:3] = numpy.frombuffer(loop_uvs, dtype=numpy.uint32).reshape(-1, 2)
+			rows[:, 3:] = numpy.frombuffer(loop_normals, dtype=numpy.uint32).reshape(-1, 3)
+			kept, remap = _unique_rows(rows)
+			faces = array('I', remap[numpy.frombuffer(triangles, dtype=numpy.uint32)].tobytes())
+		else:
+			uvs = loop_uvs.tobytes()
+			normals = loop_normals.tobytes()
+			keys = {}
+			remap = array('I', bytes(4 * count))
+			kept = array('I')
+			for loop in range(count):
+				key = (loop_verts[loop], uvs[8*loop:8*loop+8], normals[12*loop:12*loop+12])
+				v = keys.get(key)
+				if v is None:
+					v = keys[key] = len(kept)
+					kept.append(loop)
+				remap[loop] = v
+			faces = array('I', map(remap.__getitem__, triangles))
+		split = Geoset()
+		verts = _gather(array('I', loop_verts), kept, 1)
+		split.vertices = _gather(self.vertices, verts, 3)
+		split.normals = _gather(loop_normals, kept, 3)
+		split.tvertices = _gather(loop_uvs, kept, 2)
+		split.vgroups = _gather(self.vgroups, verts, 1)
+		split.faces = faces
+		split.matrices = self.matrices
+		split.matrix_sizes = self.matrix_sizes
+		return split
+
+	# Returns a hash of the whole geoset, equal for geosets with the same
+	# contents, so repeated geosets can share their mesh.
+	def digest(self):
+		h = hashlib.sha1()
+		for name in self.__slots__:
+			buf = getattr(self, name)
+			h.update('{}:{}:{};'.format(name, buf.typecode, len(buf)).encode('ascii'))
+			h.update(buf)
+		return h.hexdigest()
+
+	# Returns a zero-copy view of one of the buffers, e.g. view('vertices').
+	# The buffer can't grow while a view on it exists.
+	# @param name: Name of the buffer.
+	def view(self, name):
+		return memoryview(getattr(self, name))
+
+	# Returns zero-copy NumPy views of the geometry: vertices, normals and
+	# tvertices as float32 rows, faces as uint32 index triples, vgroups as
+	# uint32. Only available if NumPy is installed.
+	def arrays(self):
+		if numpy is None:
+			raise ImportError("Geoset.arrays() requires NumPy")
+		return {
+			'vertices': numpy.frombuffer(self.vertices, dtype=numpy.float32).reshape(-1, 3),
+			'normals': numpy.frombuffer(self.normals, dtype=numpy.float32).reshape(-1, 3),
+			'tvertices': numpy.frombuffer(self.tvertices, dtype=numpy.float32).reshape(-1, 2),
+			'faces': numpy.frombuffer(self.faces, dtype=numpy.uint32).reshape(-1, 3),
+			'vgroups': numpy.frombuffer(self.vgroups, dtype=numpy.uint32),
+			}
+
+# Our geosets are managed by this class
+class GeosetManager:
+	__slots__ = ('geosets',)
+
+	def __init__(self):
+		self.geosets = []
+
+	def __len__(self):
+		return len(self.geosets)
+
+	def __getitem__(self, i):
+		return self.geosets[i]
+
+	def __iter__(self):
+		return iter(self.geosets)
+
+	# Starts a new geoset and returns it.
+	def new_geoset(self):
+		geoset = Geoset()
+		self.geosets.append(geoset)
+		return geoset
+
+	# Adds a geoset which was parsed elsewhere, e.g. by a worker process.
+	def append(self, geoset):
+		self.geosets.append(geoset)
+
+	# Returns the geoset which is currently being filled.
+	def current(self):
+		return self.geosets[-1]
+
+	# Returns the geometry of geoset i as NumPy arrays, see Geoset.arrays().
+	# @param i: Index of the geoset.
+	def arrays(self, i):
+		return self.geosets[i].arrays()
+
+# Everything we know about a model after parsing it. The importer turns this
+# into Blender data.
+class Model:
+	def __init__(self):
+		# Geometry of all geosets.
+		self.geosets = GeosetManager()
+		# One dict per node (Bone, Helper, Attachment, ...) in file order:
+		# type, bone_name, id, parent, gid, pivot_point and the animation
+		# tracks (see new_track()) Translation, Rotation and Scaling.
+		self.skeleton = []
+		# The same nodes by ObjectId.
+		self.nodes = {}
+		# The extents of each geoset, as far as the file has them:
+		# MinimumExtent, MaximumExtent and BoundsRadius.
+		self.extents = []
+		# The MaterialID of each geoset.
+		self.material_ids = []
+		# One dict per Bitmap of the Textures block: Image (a path relative
+		# to the game's data, empty for replaceable textures), ReplaceableId
+		# and the flags WrapWidth and WrapHeight if set.
+		self.textures = []
+		# One dict per Material: PriorityPlane and layers, a list of dicts of
+		# FilterMode (see filter_modes), TextureID, Alpha and the layer_flags
+		# which are set. Animated values keep their first key.
+		self.materials = []
+		# The PivotPoints block, in ObjectId order.
+		self.pivots = []
+		# Model block: name, BoundsRadius, MinimumExtent, MaximumExtent,
+		# BlendTime.
+		self.info = {}
+		# Camera block: name, Position, Target, Rotation, FieldOfView,
+		# FarClip and NearClip.
+		self.camera = {}
+		# One dict per Anim: name, start, end, NonLooping, MoveSpeed and
+		# Rarity. Times are in milliseconds.
+		self.sequences = []
+		# The durations of the global sequences.
+		self.global_sequences = []
+		# What a recovering parse skipped or doubted, one dict per problem:
+		# severity ('error' for skipped blocks, 'warning'), block (the
+		# keyword or MDX chunk), index (of the block among the ones with
+		# the same keyword), line (None in MDX files, which give the byte
+		# offset instead) and reason.
+		self.diagnostics = []
+		self.version = None
+
+	# Returns the state of the model, to go back to with rollback() if a
+	# block turns out to be broken halfway through.
+	def mark(self):
+		state = {}
+		for name, value in vars(self).items():
+			if isinstance(value, list):
+				state[name] = len(value)
+			elif isinstance(value, dict):
+				state[name] = dict(value)
+		state['geosets'] = len(self.geosets)
+		return state
+
+	# Drops everything added since mark() was called, but the diagnostics.
+	# @param state: What mark() returned.
+	def rollback(self, state):
+		for name, value in state.items():
+			if name == 'diagnostics':
+				continue
+			elif name == 'geosets':
+				del self.geosets.geosets[value:]
+			elif isinstance(value, dict):
+				setattr(self, name, value)
+			else:
+				del getattr(self, name)[value:]
+
+	# Completes the model once a reader is done with the file: hands out the
+	# pivot points, which are stored in ObjectId order, and builds nodes.
+	# @param recover: Whether the parse was recovering. The Model block may
+	# have been skipped then, the name defaults to 'Model'.
+	def finish(self, recover=False):
+		for node in self.skeleton:
+			if 0 <= node.get('id', -1) < len(self.pivots):
+				node['pivot_point'] = self.pivots[node['id']]
+			else:
+				node['pivot_point'] = [0.0, 0.0, 0.0]
+		self.nodes = dict((node['id'], node) for node in self.skeleton if 'id' in node)
+		if recover:
+			self.info.setdefault('name', 'Model')
+		return self
+
+# Formats one of Model.diagnostics for a log message.
+def format_diagnostic(diagnostic):
+	if diagnostic.get('line') is not None:
+		where = "line {}".format(diagnostic['line'])
+	else:
+		where = "offset {}".format(diagnostic.get('offset', '?'))
+	return "{}: {} {} at {}: {}".format(diagnostic['severity'], diagnostic['block'],
+		diagnostic['index'], where, diagnostic['reason'])
@@ -0,0 +1,881 @@
+# Copyright (c) 2011 Thomas Glamsch
+# 
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# The bpy-free half of the importer: a state machine with one handler per MDL
+# block, which fills a Model (see model.py) from a text MDL file. The handlers
+# are found through keyword => handler tables.
+
+import logging
+import os
+import pdb
+import re
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from . import mdx
+from .index import BlockIndex, map_file
+from .lexer import EOF, IDENT, NUMBER, STRING, ParseError, TokenStream, numbers
+from .model import Geoset, Model, append_array, layer_flags, new_track
+from .stats import Stats
+
+dbg = False
+
+log = logging.getLogger(__name__)
+
+# With one worker per core (workers=None), files with less geoset data than
+# this are parsed in one process. Starting the workers takes longer than
+# parsing that much.
+parallel_bytes = 16 << 20
+
+# Everything a parse needs to know while it runs. The handlers keep no state
+# of their own, so one ModelParser can run several times, and several
+# parsers at once, without sharing anything.
+class ParseContext:
+	__slots__ = ('tokens', 'model', 'stats', 'handlers', 'geoset_handlers', 'geoset_filter',
+		'geoset_count', 'read_animation', 'keyword', 'prev', 'depth', 'block', 'recover')
+
+	# @param tokens: The TokenStream of the file.
+	# @param model: The Model to fill.
+	# @param stats: The Stats object to time the handlers with.
+	# @param handlers: Keyword => handler table of the top level blocks to read.
+	# @param geoset_handlers: Keyword => handler table of the blocks inside
+	# geosets. Empty if only the extents of the geosets are read.
+	def __init__(self, tokens, model, stats, handlers, geoset_handlers):
+		self.tokens = tokens
+		self.model = model
+		self.stats = stats
+		self.handlers = handlers
+		self.geoset_handlers = geoset_handlers
+		# Indices of the geosets to read (None for all) and the number of
+		# geosets seen so far.
+		self.geoset_filter = None
+		self.geoset_count = 0
+		self.read_animation = True
+		# The keyword which started the current block, e.g. 'Bone'.
+		self.keyword = None
+		# The handler which ran before the current one.
+		self.prev = None
+		# Brace depth inside the current Geoset.
+		self.depth = 0
+		# The index.Block being parsed, None without an index.
+		self.block = None
+		# Whether to go on after problems, see ModelParser.
+		self.recover = False
+
+	# Notes a problem which doesn't stop the block from being read, in
+	# Model.diagnostics.
+	# @param reason: What is wrong.
+	def warn(self, reason):
+		self.model.diagnostics.append({'severity': 'warning', 'block': self.keyword,
+			'index': self.block.ordinal if self.block is not None else 0,
+			'line': self.tokens.line(), 'reason': reason})
+
+# This is our state machine. Every state is a handler object which returns
+# the handler of the next state, so a transition is just a method call.
+class StateMachine:
+
+# @param start: The handler of the first state.
+	def __init__(self, start):
+		self.start = start
+
+# Runs the handlers until one returns None.
+# @param ctx: The ParseContext handed to every handler.
+	def run(self, ctx):
+		# Every handler run is timed, see stats.py.
+		stats = ctx.stats
+		clock = time.perf_counter
+		debug = log.isEnabledFor(logging.DEBUG)
+		handler = self.start
+		while handler is not None:
+			if debug: log.debug("%s", handler.timer)
+			start = clock()
+			next_handler = handler.run(ctx)
+			stats.add_time(handler.timer, clock() - start)
+			ctx.prev = handler
+			handler = next_handler
+
+# All Handlers should be derived from BaseHandler.
+# They all have to override the .run() function, which handles a block and
+# returns the handler to continue with (None at the end of the file).
+class BaseHandler:
+	__slots__ = ('timer',)
+
+	def __init__(self):
+		# Name of the handler's Stats timer.
+		self.timer = 'parse.' + self.__class__.__name__
+	
+	# @param ctx: The ParseContext.
+	def run(self, ctx):
+		raise NotImplementedError
+
+# This is our main handler.
+class SEARCH(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		handlers = ctx.handlers
+		
+		while True:
+			kind, value = t.next()
+			# Stop when end of the file is reached.
+			if kind == EOF:
+				return None
+			# Blocks we have no handler for or which weren't asked for (like
+			# Textures or unwanted Geosets) are skipped without tokenizing
+			# them.
+			elif kind == '{':
+				t.skip_block()
+			# If a top level block starts with a keyword from the handler
+			# table, start the appropiate handler.
+			elif kind == IDENT and value in handlers:
+				ctx.keyword = value
+				return handlers[value]
+
+# This handler just makes sure that our file has the correct MDL version.
+class VERSION(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		t.expect('{')
+		p = 1
+		while p > 0:
+			kind, value = t.next()
+			if kind == '{': p += 1
+			elif kind == '}' or kind == EOF: p -= 1
+			elif kind == IDENT and value == 'FormatVersion':
+				ctx.model.version = int(t.expect(NUMBER))
+				if ctx.model.version == 800:
+					pass
+				elif ctx.recover:
+					ctx.warn("FormatVersion {} is not supported, reading it like 800".format(ctx.model.version))
+				else:
+					raise ParseError("This MDL Version is not supported!", t.line())
+		return _search
+
+# This handler deals with the content inside a Geoset block.
+class GEOSET(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		if dbg: pdb.set_trace()
+		t = ctx.tokens
+		if ctx.prev is _search:
+			t.expect('{')
+			# Skip the geosets we weren't asked for.
+			index = ctx.geoset_count
+			ctx.geoset_count += 1
+			if ctx.geoset_filter is not None and index not in ctx.geoset_filter:
+				t.skip_block()
+				return _search
+			ctx.model.geosets.new_geoset()
+			ctx.model.extents.append({})
+			ctx.model.material_ids.append(0)
+			ctx.depth = 1
+		
+		handlers = ctx.geoset_handlers
+		while ctx.depth > 0:
+			kind, value = t.next()
+			# Nested blocks we don't need, like Anim, are skipped.
+			if kind == '{': t.skip_block()
+			elif kind == '}' or kind == EOF: ctx.depth -= 1
+			elif kind != IDENT:
+				continue
+			# If a keyword from the geoset handler table starts a block
+			# directly inside the Geoset, start the appropiate handler.
+			elif value in handlers:
+				ctx.keyword = value
+				return handlers[value]
+			elif value in ('MinimumExtent', 'MaximumExtent'):
+				ctx.model.extents[-1][value] = [n/20 for n in t.vector()]
+			elif value == 'BoundsRadius':
+				ctx.model.extents[-1][value] = float(t.expect(NUMBER))/20
+			elif value == 'MaterialID':
+				ctx.model.material_ids[-1] = int(t.expect(NUMBER))
+	
+		return _search
+
+# Like lexer.numbers(), but raises a ParseError with the line.
+# @param t: The TokenStream the text was read from.
+# @param start: The position of the block in t, for the line.
+def read_numbers(t, text, typecode='f', start=None):
+	try:
+		return numbers(text, typecode)
+	except (ValueError, OverflowError) as e:
+		raise ParseError("bad number in block: {}".format(e), t.line(start))
+
+# Reads a counted block of numbers like 'Vertices 1234 { ... }' in one go,
+# instead of tokenizing it number by number.
+# @param t: The TokenStream, positioned right after the count.
+# @param cnt: The count from the block header.
+# @param width: The amount of numbers per element.
+# @param typecode: 'f' for floats, 'I' for indices.
+def read_counted(t, cnt, width, typecode='f'):
+	start = t.pos
+	t.expect('{')
+	text = t.raw_block()
+	if typecode == 'I':
+		text = text.replace('Triangles', ' ')
+	flat = read_numbers(t, text, typecode, start)
+	if len(flat) != cnt * width:
+		raise ParseError("expected {} numbers, found {}".format(cnt * width, len(flat)), t.line(start))
+	return flat
+
+# Matches the start of an animation track block: the interpolation type and
+# an optional global sequence.
+_track_header_re = re.compile(r'\s*(\w+)\s*,?\s*(?:GlobalSeqId\s+(\d+)\s*,?)?')
+
+# Reads the key block of a track, whose '{' has just been read, and returns the
+# match of its header (None if it has no interpolation line) and the numbers of
+# its keys, with the InTan/OutTan labels and the colons after the times removed.
+# @param start: The position of the block, for errors.
+def _track_keys(t, start):
+	text = t.raw_block()
+	m = _track_header_re.match(text)
+	if m is None:
+		return None, array('f')
+	text = text[m.end():].replace('InTan', ' ').replace('OutTan', ' ').replace(':', ' ')
+	return m, read_numbers(t, text, 'f', start)
+
+# Reads an animation track like Translation and returns it as a dict, see
+# model.new_track(). The block with the keys is read in one go.
+# @param t: The TokenStream, positioned after the track's name.
+# @param width: The amount of numbers per value.
+# @param scale: Factor for the values.
+def read_track(t, width, scale=1.0):
+	cnt = int(t.expect(NUMBER))
+	start = t.pos
+	t.expect('{')
+	m, flat = _track_keys(t, start)
+	if m is None:
+		# An empty block like 'Translation 0 { }' is a track without keys.
+		if cnt == 0:
+			return new_track('DontInterp', -1, width, flat, scale=scale)
+		raise ParseError("missing interpolation", t.line(start))
+	interpolation = m.group(1)
+	if interpolation not in ('DontInterp', 'Linear', 'Hermite', 'Bezier'):
+		raise ParseError("unknown interpolation '{}'".format(interpolation), t.line(start))
+	global_seq = int(m.group(2)) if m.group(2) else -1
+	stride = 1 + width * (3 if interpolation in ('Hermite', 'Bezier') else 1)
+	if len(flat) != cnt * stride:
+		raise ParseError("expected {} numbers, found {}".format(cnt * stride, len(flat)), t.line(start))
+	return new_track(interpolation, global_seq, width, flat, scale=scale)
+
+# This handler imports the vertices inside a Geoset block.
+class VERTICES(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		# Get the number of vertices inside this Vertices block.
+		flat = read_counted(t, int(t.expect(NUMBER)), 3)
+		# Divide with 20 to scale the model down.
+		if isinstance(flat, array):
+			flat = array('f', [n/20 for n in flat])
+		else:
+			flat /= 20
+		append_array(ctx.model.geosets.current().vertices, flat)
+		return _geoset
+
+# This handler imports the vertex normals.
+class NORMALS(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		# Get the number of normals inside this Normals block.
+		flat = read_counted(t, int(t.expect(NUMBER)), 3)
+		append_array(ctx.model.geosets.current().normals, flat)
+		return _geoset
+
+# This handler imports the texture vertices (aka the UV layout).
+class TVERTICES(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		# Get the number of vertices inside this TVertices block.
+		cnt = int(t.expect(NUMBER))
+		geoset = ctx.model.geosets.current()
+		if geoset.tvertices:
+			# Only the first UV set is used, like for MDX.
+			t.expect('{')
+			t.skip_block()
+			return _geoset
+		flat = read_counted(t, cnt, 2)
+		# MDL counts V from the top of the texture, Blender from the bottom.
+		if isinstance(flat, array):
+			flat[1::2] = array('f', [1 - v for v in flat[1::2]])
+		else:
+			flat[1::2] = 1 - flat[1::2]
+		append_array(geoset.tvertices, flat)
+		return _geoset
+
+# This handler imports the faces inside a Geoset block.
+class FACES(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		# Faces is a strange construction. The first number is the number of
+		# data blocks, cnt the total amount of vertex indices.
+		t.expect(NUMBER)
+		cnt = int(t.expect(NUMBER))
+		li = read_counted(t, cnt, 1, 'I')
+		if dbg: log.debug("%d", len(li))
+		append_array(ctx.model.geosets.current().faces, li[:cnt - cnt % 3])
+		return _geoset
+		
+# This is the handler for importing groups matrix data for armature rigging
+class GROUPS(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		cnt = int(t.expect(NUMBER))
+		t.expect(NUMBER)
+		t.expect('{')
+		geoset = ctx.model.geosets.current()
+		# Run for as many GROUPs as the file claims there are.
+		for i in range(cnt):
+			t.expect(IDENT) # Matrices
+			li = t.vector(int)
+			geoset.matrices.extend(li)
+			geoset.matrix_sizes.append(len(li))
+			t.accept(',')
+		t.expect('}')
+		return _geoset
+			
+# This handler imports the vertex group assignment for each vertex.
+class VERTEXGROUP(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		# There's no count in the header, so we take whatever is in the block,
+		# which has to be one per vertex if the vertices came first.
+		start = t.pos
+		t.expect('{')
+		geoset = ctx.model.geosets.current()
+		li = read_numbers(t, t.raw_block(), 'I', start)
+		if geoset.vertices and len(li) != len(geoset.vertices) // 3:
+			raise ParseError("expected {} vertex groups, found {}".format(len(geoset.vertices) // 3, len(li)),
+				t.line(start))
+		append_array(geoset.vgroups, li)
+		return _geoset
+		
+# Pivot point handler. The n-th pivot point belongs to the node with ObjectId
+# n, Model.finish() hands them out once all nodes are known.
+class PIVOTPOINTS(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		cnt = int(t.expect(NUMBER))
+		t.expect('{')
+		for i in range(cnt):
+			ctx.model.pivots.append([n/20 for n in t.vector()])
+			t.accept(',')
+		t.expect('}')
+		return _search
+		
+# This handles all kinds of nodes: Bones, Helpers (which seem to be used as
+# dummy/parent bones), Attachments, Lights, emitters and so on. They all have
+# an ObjectId and can have a parent.
+class NODE(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		# Store node type and name
+		node = {'type': ctx.keyword}
+		ctx.model.skeleton.append(node)
+		node['bone_name'] = t.expect(STRING)
+		t.expect('{')
+		
+		p = 1
+		while p > 0:
+			kind, key = t.next()
+			# Nested blocks we don't use, like Visibility, are skipped.
+			if kind == '{': t.skip_block()
+			elif kind == '}' or kind == EOF: p -= 1
+			elif kind != IDENT:
+				continue
+			elif key == 'ObjectId':
+				node['id'] = int(t.expect(NUMBER))
+			elif key == 'Parent':
+				node['parent'] = int(t.expect(NUMBER))
+			elif key == 'GeosetId':
+				# Either a number or 'Multiple'.
+				kind, value = t.next()
+				node['gid'] = int(value) if kind == NUMBER else -1
+			elif key in ('Translation', 'Rotation', 'Scaling') and ctx.read_animation:
+				# Divide translations with 20 like the vertices.
+				if key == 'Translation':
+					node[key] = read_track(t, 3, 1.0/20)
+				else:
+					node[key] = read_track(t, 4 if key == 'Rotation' else 3)
+				
+		return _search
+
+# This handles the Sequences block: one Anim block per sequence.
+class SEQUENCES(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		t.expect(NUMBER)
+		t.expect('{')
+		while True:
+			kind, key = t.next()
+			if kind == '}' or kind == EOF:
+				break
+			elif kind == '{':
+				t.skip_block()
+			elif kind == IDENT and key == 'Anim':
+				anim = {'name': t.expect(STRING), 'NonLooping': False, 'MoveSpeed': 0.0, 'Rarity': 0.0}
+				ctx.model.sequences.append(anim)
+				t.expect('{')
+				while True:
+					kind, key = t.next()
+					if kind == '}' or kind == EOF:
+						break
+					elif kind == '{':
+						t.skip_block()
+					elif kind != IDENT:
+						continue
+					elif key == 'Interval':
+						anim['start'], anim['end'] = t.vector(int)
+					elif key == 'NonLooping':
+						anim['NonLooping'] = True
+					elif key in ('MoveSpeed', 'Rarity'):
+						anim[key] = float(t.expect(NUMBER))
+		return _search
+
+# This handles the GlobalSequences block, which only holds durations.
+class GLOBALSEQUENCES(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		t.expect(NUMBER)
+		t.expect('{')
+		while True:
+			kind, key = t.next()
+			if kind == '}' or kind == EOF:
+				break
+			elif kind == IDENT and key == 'Duration':
+				ctx.model.global_sequences.append(int(t.expect(NUMBER)))
+		return _search
+
+# Returns the value of the first key of an animated material value like
+# 'Alpha 2 { Linear, 0: 1, 500: 0, }', whose count has just been read, or None
+# if it has no keys.
+def _first_key(t):
+	start = t.pos
+	t.expect('{')
+	flat = _track_keys(t, start)[1]
+	return float(flat[1]) if len(flat) > 1 else None
+
+# This handles the Textures block: one Bitmap block per texture.
+class TEXTURES(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		t.expect(NUMBER)
+		t.expect('{')
+		while True:
+			kind, key = t.next()
+			if kind == '}' or kind == EOF:
+				break
+			elif kind == '{':
+				t.skip_block()
+			elif kind == IDENT and key == 'Bitmap':
+				texture = {'Image': '', 'ReplaceableId': 0}
+				ctx.model.textures.append(texture)
+				t.expect('{')
+				while True:
+					kind, key = t.next()
+					if kind == '}' or kind == EOF:
+						break
+					elif kind == '{':
+						t.skip_block()
+					elif kind != IDENT:
+						continue
+					elif key == 'Image':
+						texture[key] = t.expect(STRING)
+					elif key == 'ReplaceableId':
+						texture[key] = int(t.expect(NUMBER))
+					elif key in ('WrapWidth', 'WrapHeight'):
+						texture[key] = True
+		return _search
+
+# This handles the Materials block: Material blocks with Layer blocks.
+class MATERIALS(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		t.expect(NUMBER)
+		t.expect('{')
+		while True:
+			kind, key = t.next()
+			if kind == '}' or kind == EOF:
+				break
+			elif kind == '{':
+				t.skip_block()
+			elif kind == IDENT and key == 'Material':
+				material = {'PriorityPlane': 0, 'layers': []}
+				ctx.model.materials.append(material)
+				t.expect('{')
+				while True:
+					kind, key = t.next()
+					if kind == '}' or kind == EOF:
+						break
+					elif kind == '{':
+						t.skip_block()
+					elif kind != IDENT:
+						continue
+					elif key == 'PriorityPlane':
+						material[key] = int(t.expect(NUMBER))
+					elif key == 'Layer':
+						material['layers'].append(self.layer(t))
+		return _search
+
+	# Reads a Layer block and returns it as a dict.
+	def layer(self, t):
+		layer = {'FilterMode': 'None', 'TextureID': 0, 'Alpha': 1.0}
+		flags = dict(layer_flags)
+		t.expect('{')
+		while True:
+			kind, key = t.next()
+			if kind == '}' or kind == EOF:
+				break
+			elif kind == '{':
+				t.skip_block()
+			elif kind != IDENT:
+				continue
+			elif key == 'FilterMode':
+				layer[key] = t.expect(IDENT)
+			elif key in flags:
+				layer[key] = True
+			elif key in ('TextureID', 'Alpha'):
+				# 'static TextureID 0' or an animated 'TextureID 2 { ... }'.
+				value = float(t.expect(NUMBER))
+				if t.peek()[0] == '{':
+					value = _first_key(t)
+				if value is not None:
+					layer[key] = int(value) if key == 'TextureID' else value
+		return layer
+
+# This handles the Model block
+class MODEL(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		# Store the model's name
+		ctx.model.info['name'] = t.expect(STRING)
+		t.expect('{')
+		# Stop the loop when the block ends, nested blocks are skipped
+		p = 1
+		while p > 0:
+			kind, key = t.next()
+			if kind == '{': t.skip_block()
+			elif kind == '}' or kind == EOF: p -= 1
+			# Only the bounds and 'BlendTime' are interesting
+			elif kind != IDENT:
+				continue
+			elif key == 'BoundsRadius':
+				ctx.model.info[key] = float(t.expect(NUMBER))
+			elif key in ('MinimumExtent', 'MaximumExtent'):
+				ctx.model.info[key] = [n/20 for n in t.vector()]
+			elif key == 'BlendTime':
+				ctx.model.info[key] = int(t.expect(NUMBER))
+		return _search
+
+# This handles any Camera block (assume one max for now but this should change)
+class CAMERA(BaseHandler):
+	__slots__ = ()
+
+	def run(self, ctx):
+		t = ctx.tokens
+		# Store camera name
+		ctx.model.camera['name'] = t.expect(STRING)
+		t.expect('{')
+		# Stop the loop when the block ends, nested blocks are skipped
+		p = 1
+		while p > 0:
+			kind, key = t.next()
+			if kind == '{': t.skip_block()
+			elif kind == '}' or kind == EOF: p -= 1
+			elif kind != IDENT:
+				continue
+			elif key == 'Position':
+				ctx.model.camera[key] = [n/20 for n in t.vector()]
+			elif key == 'Target':
+				# The target has a Position of its own.
+				t.expect('{')
+				while True:
+					kind, key = t.next()
+					if kind == '}' or kind == EOF: break
+					elif kind == '{': t.skip_block()
+					elif kind == IDENT and key == 'Position':
+						ctx.model.camera['Target'] = [n/20 for n in t.vector()]
+			elif key == 'FieldOfView':
+				ctx.model.camera[key] = float(t.expect(NUMBER))
+			elif key == 'FarClip':
+				ctx.model.camera[key] = float(t.expect(NUMBER))/20
+			elif key == 'NearClip':
+				ctx.model.camera[key] = float(t.expect(NUMBER))/20
+			elif key == 'Rotation':
+				# Camera rotation is an animated track, we'll worry about
+				# animations later.
+				t.expect(NUMBER)
+				t.expect('{')
+				t.skip_block()
+		return _search
+
+
+# The handlers. They are stateless, so these instances are shared by all
+# parses.
+_search = SEARCH()
+_geoset = GEOSET()
+
+# Handlers of the blocks directly inside a Geoset, by keyword.
+geoset_handlers = {
+	'Vertices': VERTICES(),
+	'Normals': NORMALS(),
+	'TVertices': TVERTICES(),
+	'Faces': FACES(),
+	'VertexGroup': VERTEXGROUP(),
+	'Groups': GROUPS(),
+	}
+
+nodekeys = ['Bone', 'Helper', 'Attachment', 'Light', 'EventObject', 'CollisionShape',
+	'ParticleEmitter', 'ParticleEmitter2', 'RibbonEmitter']
+
+# Handlers of the top level blocks, by keyword.
+global_handlers = {
+	'Version': VERSION(),
+	'Model': MODEL(),
+	'Sequences': SEQUENCES(),
+	'GlobalSequences': GLOBALSEQUENCES(),
+	'Geoset': _geoset,
+	'PivotPoints': PIVOTPOINTS(),
+	'Camera': CAMERA(),
+	'Textures': TEXTURES(),
+	'Materials': MATERIALS(),
+	}
+_node = NODE()
+for key in nodekeys:
+	global_handlers[key] = _node
+
+# Which part of the file each top level keyword belongs to. Version and Model
+# are always read.
+partkeys = dict([('Geoset', 'GEOMETRY'), ('PivotPoints', 'SKELETON'), ('Camera', 'CAMERA'),
+	('Sequences', 'ANIMATION'), ('GlobalSequences', 'ANIMATION'),
+	('Textures', 'MATERIALS'), ('Materials', 'MATERIALS')]
+	+ [(key, 'SKELETON') for key in nodekeys])
+
+# This class runs the state machine over a file and returns the gathered data
+# in a Model. All state of a run lives in a fresh ParseContext, so a parser
+# can be used for any number of files.
+class ModelParser:
+	# @param parts: The parts of the file to read, a set of 'GEOMETRY',
+	# 'BOUNDS', 'SKELETON', 'ANIMATION', 'MATERIALS' and 'CAMERA'. None reads
+	# everything.
+	# The Version and Model blocks are always read, the node animations only
+	# with the skeleton. 'BOUNDS' reads only the extents of the geosets,
+	# which are read with the geometry as well.
+	# @param geosets: Indices of the geosets to read, None for all of them.
+	# @param stats: A Stats object to time the handlers with.
+	# @param workers: Number of worker processes parsing the geosets of a
+	# file in parallel, None for one per core if the file is big enough.
+	# See run_mapped().
+	# @param recover: Whether to skip the blocks which don't parse instead of
+	# giving up on the whole file. Each skipped block is noted in
+	# Model.diagnostics and leaves nothing behind but, for Geosets, an
+	# empty geoset, so the indices of the others stay the same. Versions
+	# other than 800 are read as well, with a warning.
+	def __init__(self, parts=None, geosets=None, stats=None, workers=1, recover=False):
+		self.stats = stats or Stats()
+		self.parts = parts
+		self.workers = workers
+		self.recover = recover
+		self.geoset_handlers = geoset_handlers
+		if parts is not None and 'BOUNDS' in parts and 'GEOMETRY' not in parts:
+			# Go through the Geoset blocks, but only for their extents.
+			self.geoset_handlers = {}
+			parts = set(parts) | set(['GEOMETRY'])
+		self.handlers = dict((key, handler) for key, handler in global_handlers.items()
+			if parts is None or key not in partkeys or partkeys[key] in parts)
+		self.geoset_filter = None if geosets is None else frozenset(geosets)
+		self.read_animation = parts is None or 'ANIMATION' in parts
+		self.machine = StateMachine(_search)
+
+	# Parses MDL data and returns the Model. Only the blocks which are read
+	# are decoded and parsed, the others are found and skipped through a
+	# BlockIndex. With more than one worker the geosets are parsed by a pool
+	# of processes, while this one parses the rest of the file.
+	# @param data: The MDL data as bytes or a mmap (see index.map_file()).
+	# @param filepath: The file the data is from, which the workers read
+	# their geosets from. Without it everything is parsed here.
+	# @param blocks: Only parse these blocks, from the index of the whole
+	# file. data is then not indexed again.
+	def run_mapped(self, data, filepath=None, blocks=None):
+		if blocks is None:
+			self.stats.count('parse.bytes', len(data))
+			with self.stats.timer('parse.index'):
+				index = BlockIndex(data)
+			blocks = [block for block in index.blocks if block.keyword in self.handlers
+				and (block.keyword != 'Geoset' or self.geoset_filter is None
+					or block.ordinal in self.geoset_filter)]
+		else:
+			index = BlockIndex(data, blocks)
+		model = Model()
+		ctx = self.context(None, model)
+		# Unwanted geosets are never handed to the state machine.
+		ctx.geoset_filter = None
+
+		# Only real geometry is worth sending to other processes.
+		workers = self.workers or os.cpu_count() or 1
+		parallel = []
+		if filepath is not None and workers > 1 and self.geoset_handlers:
+			parallel = [block for block in blocks if block.keyword == 'Geoset']
+			if self.workers is None and sum(block.end - block.start for block in parallel) < parallel_bytes:
+				parallel = []
+		pool = None
+		results = []
+		try:
+			if len(parallel) > 1:
+				blocks = [block for block in blocks if block.keyword != 'Geoset']
+				pool = ProcessPoolExecutor(max_workers=min(workers, len(parallel)))
+				results = pool.map(_parse_geoset, [(filepath, block, self.parts, self.recover)
+					for block in parallel])
+			self.parse_blocks(ctx, index, blocks)
+			# Merge the geosets in file order.
+			for geoset, extent, material_id, diagnostics, stats in results:
+				model.geosets.append(geoset)
+				model.extents.append(extent)
+				model.material_ids.append(material_id)
+				model.diagnostics.extend(diagnostics)
+				self.stats.merge(stats)
+		finally:
+			if pool is not None:
+				pool.shutdown()
+		model.diagnostics.sort(key=lambda diagnostic: diagnostic['line'])
+		return model.finish(self.recover)
+
+	# Runs the state machine over blocks of an index, one after the other.
+	def parse_blocks(self, ctx, index, blocks):
+		for block in blocks:
+			text = index.text(block)
+			# The offsets of the index are only valid in plain ASCII text.
+			ends = index.ends(block) if len(text) == block.end - block.start else None
+			ctx.tokens = TokenStream(text, partial(index.line, block), ends)
+			ctx.block = block
+			if not block.closed:
+				ctx.model.diagnostics.append({'severity': 'warning', 'block': block.keyword,
+					'index': block.ordinal, 'line': index.line(block),
+					'reason': "the file ends inside this block, it may be cut off"})
+			if not self.recover:
+				self.machine.run(ctx)
+				continue
+			state = ctx.model.mark()
+			try:
+				self.machine.run(ctx)
+			except (ParseError, ValueError, OverflowError, IndexError, KeyError,
+					AttributeError, TypeError) as e:
+				ctx.model.rollback(state)
+				self.skip(ctx, block, e)
+
+	# Notes a block which didn't parse in Model.diagnostics. A Geoset is
+	# replaced by an empty one.
+	# @param error: The exception the block raised.
+	def skip(self, ctx, block, error):
+		model = ctx.model
+		line = getattr(error, 'line', None)
+		reason = getattr(error, 'reason', None) or "{}: {}".format(type(error).__name__, error)
+		model.diagnostics.append({'severity': 'error', 'block': block.keyword, 'index': block.ordinal,
+			'line': line if line is not None else ctx.tokens.line(), 'reason': reason})
+		self.stats.count('parse.skipped')
+		if block.keyword == 'Geoset':
+			model.geosets.append(Geoset())
+			model.extents.append({})
+			model.material_ids.append(0)
+
+	# Returns a fresh ParseContext for one run.
+	def context(self, tokens, model):
+		ctx = ParseContext(tokens, model, self.stats, self.handlers, self.geoset_handlers)
+		ctx.geoset_filter = self.geoset_filter
+		ctx.read_animation = self.read_animation
+		ctx.recover = self.recover
+		return ctx
+
+# Parses a single Geoset block, this is what the workers of a parallel parse
+# run. Returns the geoset, its extent, its MaterialID, its diagnostics and the
+# timings. The arrays of the geoset are sent back as they are, which pickles
+# them as raw bytes.
+# @param job: The path of the MDL file, the Block, the parts to read and
+# whether to recover.
+def _parse_geoset(job):
+	filepath, block, parts, recover = job
+	stats = Stats()
+	with open(filepath, 'rb') as infile:
+		data = map_file(infile)
+		try:
+			model = ModelParser(parts, None, stats, recover=recover).run_mapped(data, blocks=[block])
+		finally:
+			if hasattr(data, 'close'):
+				data.close()
+	return model.geosets[0], model.extents[0], model.material_ids[0], model.diagnostics, stats
+
+# Turns a list of geoset indices like '0,2-4' into a list of ints, or None if
+# the text is empty.
+# @param text: Comma separated indices and inclusive ranges.
+def parse_indices(text):
+	if not text.strip():
+		return None
+	indices = []
+	for part in text.split(','):
+		first, dash, last = part.partition('-')
+		try:
+			first = int(first)
+			last = int(last) if dash else first
+		except ValueError:
+			raise ValueError("Invalid geoset index '{}'".format(part.strip()))
+		indices.extend(range(first, last + 1))
+	return indices
+
+# Parses an MDL or MDX file and returns its Model.
+# @param filepath: Path of the .mdl or .mdx file.
+# @param parts, geosets: Only read parts of the file, see ModelParser.
+# @param stats: A Stats object to collect timings in.
+# @param workers: Number of processes parsing the geosets of an MDL file in
+# parallel, None for one per core if there are at least parallel_bytes of
+# them. MDX files are always read in one go.
+# @param recover: Whether to skip what doesn't parse, see ModelParser. The
+# problems are in the diagnostics of the Model.
+def parse_file(filepath, parts=None, geosets=None, stats=None, workers=1, recover=False):
+	if filepath.lower().endswith('.mdx'):
+		return mdx.parse_file(filepath, parts, geosets, stats, recover)
+	with open(filepath, 'rb') as infile:
+		data = map_file(infile)
+		try:
+			return ModelParser(parts, geosets, stats, workers, recover).run_mapped(data, filepath)
+		finally:
+			if hasattr(data, 'close'):
+				data.close()
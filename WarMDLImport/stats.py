@@ -0,0 +1,100 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Counters and timers for the stages of an import (parser handlers, MDX chunks,
+# the parse cache and the Blender build steps), so we can tell which stage got
+# slow when a model takes long to import.
+
+import json
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# Times a with block into one of the timers of a Stats object.
+class _Timer:
+	__slots__ = ('stats', 'name', 'start')
+
+	def __init__(self, stats, name):
+		self.stats = stats
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc_info):
+		self.stats.add_time(self.name, time.perf_counter() - self.start)
+		return False
+
+class Stats:
+	def __init__(self):
+		# name => [calls, seconds]
+		self.timers = {}
+		# name => count
+		self.counters = {}
+
+	# Adds to a counter.
+	# @param name: Name of the counter, like 'vertices'.
+	# @param n: The amount to add.
+	def count(self, name, n=1):
+		self.counters[name] = self.counters.get(name, 0) + n
+
+	# Adds one call to a timer.
+	# @param name: Name of the timer, like 'build.camera'.
+	# @param seconds: How long the call took.
+	def add_time(self, name, seconds):
+		timer = self.timers.get(name)
+		if timer is None:
+			timer = self.timers[name] = [0, 0.0]
+		timer[0] += 1
+		timer[1] += seconds
+
+	# Returns a context manager which times its with block:
+	#   with stats.timer('build.camera'):
+	#       ...
+	# @param name: Name of the timer.
+	def timer(self, name):
+		return _Timer(self, name)
+
+	# Adds all timers and counters of another Stats object to this one, e.g.
+	# the ones of a worker process.
+	def merge(self, other):
+		for name, (calls, seconds) in other.timers.items():
+			timer = self.timers.setdefault(name, [0, 0.0])
+			timer[0] += calls
+			timer[1] += seconds
+		for name, n in other.counters.items():
+			self.count(name, n)
+
+	# Returns the timers and counters as plain dicts, ready for JSON.
+	def as_dict(self):
+		return {
+			'timers': dict((name, {'calls': calls, 'seconds': seconds})
+				for name, (calls, seconds) in self.timers.items()),
+			'counters': dict(self.counters),
+			}
+
+	# Writes the timers and counters to a JSON file.
+	# @param filepath: Path of the report.
+	def write_json(self, filepath):
+		with open(filepath, 'w') as outfile:
+			json.dump(self.as_dict(), outfile, indent=1, sort_keys=True)
+
+	# Logs all timers, the slowest first, and the counters.
+	# @param level: The logging level to use.
+	def log_summary(self, level=logging.INFO):
+		if not log.isEnabledFor(level):
+			return
+		for name, (calls, seconds) in sorted(self.timers.items(), key=lambda item: -item[1][1]):
+			log.log(level, "%-28s %8.3f s %8d calls", name, seconds, calls)
+		for name, n in sorted(self.counters.items()):
+			log.log(level, "%-28s %10d", name, n)
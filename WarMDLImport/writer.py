@@ -0,0 +1,275 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Writes a Model (see model.py) as an MDL file of version 800, the reverse of
+# parser.py. Like the parser it doesn't need Blender:
+#
+#   from WarMDLImport.parser import parse_file
+#   from WarMDLImport.writer import write_file
+#   write_file(parse_file('Footman.mdx'), 'Footman.mdl')
+#
+# Blocks of numbers are formatted many rows at a time with a single % and the
+# text goes out through a large write buffer, so there is no write() per value.
+
+from array import array
+
+from . import bl_info
+from .model import layer_flags
+from .stats import Stats
+
+# Rows formatted with one % operation.
+_batch = 4096
+
+# Size of the write buffer of write_file().
+_buffer_size = 1 << 20
+
+# Node types the parser knows, but which we can't write all required fields
+# of. They are written as Helpers.
+_node_types = ('Bone', 'Helper')
+
+# Formats numbers for the file.
+def _num(n):
+	return '{:.6f}'.format(n).rstrip('0').rstrip('.') or '0'
+
+def _vector(values):
+	return '{ ' + ', '.join(_num(n) for n in values) + ' }'
+
+# Returns a copy of a flat array with every number multiplied by factor.
+def _scaled(flat, factor):
+	return array('f', [n * factor for n in flat])
+
+# Writes a flat array of numbers as rows of width numbers, like the insides
+# of a Vertices block.
+# @param out: A text mode file object.
+# @param flat: The numbers, a list, an array.array or a NumPy array.
+# @param row: Format of one row with width %-fields, like '\t\t{ %f, %f },\n'.
+def _write_rows(out, flat, width, row):
+	if not isinstance(flat, (array, list)):
+		flat = flat.tolist()
+	count = len(flat) // width
+	for first in range(0, count, _batch):
+		n = min(_batch, count - first)
+		out.write((row * n) % tuple(flat[first * width:(first + n) * width]))
+
+def _row(indent, width, field='%.6f'):
+	return indent + '{ ' + ', '.join([field] * width) + ' },\n'
+
+# Writes an animation track, see model.new_track().
+# @param name: The keyword, e.g. 'Translation'.
+# @param scale: Factor for the values and tangents.
+def _write_track(out, name, track, scale=1.0):
+	width = track['width']
+	times = track['times']
+	out.write('\t{} {} {{\n\t\t{},\n'.format(name, len(times), track['interpolation']))
+	if track['global_seq'] >= 0:
+		out.write('\t\tGlobalSeqId {},\n'.format(track['global_seq']))
+	columns = [track['values']]
+	row = '\t\t%d: ' + _row('', width)
+	if track['interpolation'] in ('Hermite', 'Bezier'):
+		columns += [track['in_tans'], track['out_tans']]
+		row += '\t\t\tInTan ' + _row('', width) + '\t\t\tOutTan ' + _row('', width)
+	if scale != 1.0:
+		columns = [_scaled(c, scale) for c in columns]
+	# Interleave time, value and tangents of each key.
+	flat = []
+	for k, time in enumerate(times):
+		flat.append(time)
+		for c in columns:
+			flat.extend(c[k * width:(k + 1) * width])
+	_write_rows(out, flat, 1 + width * len(columns), row)
+	out.write('\t}\n')
+
+# Writes the MDL blocks of a Model in the usual order.
+class ModelWriter:
+	# @param stats: A Stats object to time the blocks with.
+	def __init__(self, stats=None):
+		self.stats = stats or Stats()
+
+	# @param model: The Model to write.
+	# @param out: A text mode file object.
+	def write(self, model, out):
+		out.write('// Exported by {} {}\n'.format(bl_info['name'],
+			'.'.join(str(n) for n in bl_info['version'])))
+		with self.stats.timer('write.header'):
+			self.write_header(model, out)
+		for i, geoset in enumerate(model.geosets):
+			with self.stats.timer('write.geoset'):
+				extent = model.extents[i] if i < len(model.extents) else {}
+				material_id = model.material_ids[i] if i < len(model.material_ids) else 0
+				self.write_geoset(geoset, extent, out, material_id)
+		with self.stats.timer('write.nodes'):
+			self.write_nodes(model, out)
+		if model.camera:
+			self.write_camera(model.camera, out)
+
+	# Writes Version, Model, Sequences, GlobalSequences, Textures and
+	# Materials.
+	def write_header(self, model, out):
+		info = model.info
+		out.write('Version {\n\tFormatVersion 800,\n}\n')
+		out.write('Model "{}" {{\n'.format(info.get('name', 'Model')))
+		out.write('\tNumGeosets {},\n'.format(len(model.geosets)))
+		bones = sum(1 for node in model.skeleton if node.get('type') == 'Bone')
+		if bones:
+			out.write('\tNumBones {},\n'.format(bones))
+		if len(model.skeleton) > bones:
+			out.write('\tNumHelpers {},\n'.format(len(model.skeleton) - bones))
+		out.write('\tBlendTime {},\n'.format(info.get('BlendTime', 150)))
+		for key in ('MinimumExtent', 'MaximumExtent'):
+			if key in info:
+				out.write('\t{} {},\n'.format(key, _vector(n * 20 for n in info[key])))
+		if 'BoundsRadius' in info:
+			out.write('\tBoundsRadius {},\n'.format(_num(info['BoundsRadius'])))
+		out.write('}\n')
+
+		if model.sequences:
+			out.write('Sequences {} {{\n'.format(len(model.sequences)))
+			for seq in model.sequences:
+				out.write('\tAnim "{}" {{\n\t\tInterval {{ {}, {} }},\n'.format(seq['name'], seq['start'], seq['end']))
+				if seq.get('NonLooping'):
+					out.write('\t\tNonLooping,\n')
+				for key in ('MoveSpeed', 'Rarity'):
+					if seq.get(key):
+						out.write('\t\t{} {},\n'.format(key, _num(seq[key])))
+				out.write('\t}\n')
+			out.write('}\n')
+		if model.global_sequences:
+			out.write('GlobalSequences {} {{\n'.format(len(model.global_sequences)))
+			out.write(''.join('\tDuration {},\n'.format(d) for d in model.global_sequences))
+			out.write('}\n')
+
+		self.write_materials(model, out)
+
+	# Writes the Textures and Materials blocks. A model without materials
+	# gets a single team colored one, which all its geosets use.
+	def write_materials(self, model, out):
+		if not model.materials:
+			out.write('Textures 1 {\n\tBitmap {\n\t\tImage "",\n\t\tReplaceableId 1,\n\t}\n}\n')
+			out.write('Materials 1 {\n\tMaterial {\n\t\tLayer {\n\t\t\tFilterMode None,\n'
+				'\t\t\tstatic TextureID 0,\n\t\t}\n\t}\n}\n')
+			return
+		out.write('Textures {} {{\n'.format(len(model.textures)))
+		for texture in model.textures:
+			out.write('\tBitmap {{\n\t\tImage "{}",\n'.format(texture.get('Image', '')))
+			if texture.get('ReplaceableId'):
+				out.write('\t\tReplaceableId {},\n'.format(texture['ReplaceableId']))
+			for key in ('WrapWidth', 'WrapHeight'):
+				if texture.get(key):
+					out.write('\t\t{},\n'.format(key))
+			out.write('\t}\n')
+		out.write('}\n')
+		out.write('Materials {} {{\n'.format(len(model.materials)))
+		for material in model.materials:
+			out.write('\tMaterial {\n')
+			if material.get('PriorityPlane'):
+				out.write('\t\tPriorityPlane {},\n'.format(material['PriorityPlane']))
+			for layer in material['layers']:
+				out.write('\t\tLayer {{\n\t\t\tFilterMode {},\n'.format(layer.get('FilterMode', 'None')))
+				for name, bit in layer_flags:
+					if layer.get(name):
+						out.write('\t\t\t{},\n'.format(name))
+				out.write('\t\t\tstatic TextureID {},\n'.format(layer.get('TextureID', 0)))
+				if layer.get('Alpha', 1.0) != 1.0:
+					out.write('\t\t\tstatic Alpha {},\n'.format(_num(layer['Alpha'])))
+				out.write('\t\t}\n')
+			out.write('\t}\n')
+		out.write('}\n')
+
+	# Writes one Geoset block.
+	# @param extent: The extent of the geoset, see Model.extents.
+	# @param material_id: The index of the geoset's material.
+	def write_geoset(self, geoset, extent, out, material_id=0):
+		vertices = len(geoset.vertices) // 3
+		out.write('Geoset {\n')
+		out.write('\tVertices {} {{\n'.format(vertices))
+		_write_rows(out, _scaled(geoset.vertices, 20), 3, _row('\t\t', 3))
+		out.write('\t}\n')
+		if len(geoset.normals) == len(geoset.vertices):
+			out.write('\tNormals {} {{\n'.format(vertices))
+			_write_rows(out, geoset.normals, 3, _row('\t\t', 3))
+			out.write('\t}\n')
+		if len(geoset.tvertices) == vertices * 2:
+			# Flip V back, MDL counts it from the top of the texture.
+			uvs = array('f', geoset.tvertices)
+			uvs[1::2] = array('f', [1 - v for v in uvs[1::2]])
+			out.write('\tTVertices {} {{\n'.format(vertices))
+			_write_rows(out, uvs, 2, _row('\t\t', 2))
+			out.write('\t}\n')
+		vgroups = geoset.vgroups
+		groups = geoset.groups()
+		if len(vgroups) != vertices:
+			# Like the exporter, vertices without a group go to the first bone.
+			vgroups = [0] * vertices
+			groups = groups or [[0]]
+		out.write('\tVertexGroup {\n')
+		_write_rows(out, vgroups, 1, '\t\t%d,\n')
+		out.write('\t}\n')
+		faces = geoset.faces
+		out.write('\tFaces 1 {} {{\n\t\tTriangles {{\n\t\t\t{{ '.format(len(faces)))
+		if len(faces):
+			_write_rows(out, faces[:-1], 1, '%d, ')
+			out.write('{} '.format(faces[-1]))
+		out.write('},\n\t\t}\n\t}\n')
+		out.write('\tGroups {} {} {{\n'.format(len(groups), sum(len(group) for group in groups)))
+		for group in groups:
+			out.write('\t\tMatrices {{ {} }},\n'.format(', '.join(str(s) for s in group)))
+		out.write('\t}\n')
+		for key in ('MinimumExtent', 'MaximumExtent'):
+			if key in extent:
+				out.write('\t{} {},\n'.format(key, _vector(n * 20 for n in extent[key])))
+		if 'BoundsRadius' in extent:
+			out.write('\tBoundsRadius {},\n'.format(_num(extent['BoundsRadius'] * 20)))
+		out.write('\tMaterialID {},\n\tSelectionGroup 0,\n}}\n'.format(material_id))
+
+	# Writes the nodes, Bones first, and the PivotPoints. Nodes without an
+	# ObjectId are left out.
+	def write_nodes(self, model, out):
+		nodes = [node for node in model.skeleton if 'id' in node]
+		nodes.sort(key=lambda node: node.get('type') != 'Bone')
+		for node in nodes:
+			kind = node['type'] if node.get('type') in _node_types else 'Helper'
+			out.write('{} "{}" {{\n\tObjectId {},\n'.format(kind, node['bone_name'], node['id']))
+			if node.get('parent', -1) >= 0:
+				out.write('\tParent {},\n'.format(node['parent']))
+			if kind == 'Bone':
+				gid = node.get('gid', -1)
+				out.write('\tGeosetId {},\n\tGeosetAnimId None,\n'.format(gid if gid >= 0 else 'Multiple'))
+			for key in ('Translation', 'Rotation', 'Scaling'):
+				if node.get(key) and len(node[key]['times']):
+					_write_track(out, key, node[key], 20.0 if key == 'Translation' else 1.0)
+			out.write('}\n')
+		if nodes:
+			pivots = dict((node['id'], node.get('pivot_point', [0.0, 0.0, 0.0])) for node in nodes)
+			count = max(pivots) + 1
+			out.write('PivotPoints {} {{\n'.format(count))
+			for i in range(count):
+				out.write('\t{},\n'.format(_vector(n * 20 for n in pivots.get(i, (0.0, 0.0, 0.0)))))
+			out.write('}\n')
+
+	# Writes the Camera block. What the camera dict lacks gets the defaults of
+	# the game's cameras.
+	def write_camera(self, camera, out):
+		position = camera.get('Position', [0.0, 0.0, 0.0])
+		out.write('Camera "{}" {{\n'.format(camera.get('name', 'Camera')))
+		out.write('\tPosition {},\n'.format(_vector(n * 20 for n in position)))
+		out.write('\tFieldOfView {},\n'.format(_num(camera.get('FieldOfView', 0.7853))))
+		out.write('\tFarClip {},\n'.format(_num(camera.get('FarClip', 250.0) * 20)))
+		out.write('\tNearClip {},\n'.format(_num(camera.get('NearClip', 0.4) * 20)))
+		out.write('\tTarget {{\n\t\tPosition {},\n\t}}\n'.format(
+			_vector(n * 20 for n in camera.get('Target', position))))
+		out.write('}\n')
+
+# Writes a Model to an MDL file.
+# @param filepath: Path of the .mdl file.
+# @param stats: A Stats object to collect timings in.
+def write_file(model, filepath, stats=None):
+	with open(filepath, 'w', encoding='utf-8', buffering=_buffer_size) as out:
+		ModelWriter(stats).write(model, out)
@@ -0,0 +1,88 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Measures the Python side of building a parsed model, with a stub bpy (see
+# stub_bpy.py) instead of Blender. The model is parsed once, only
+# DataImporter.build() is timed:
+#
+#   python benchmarks/bench_build.py --vertices 50000 --json build.json
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate
+import stub_bpy
+
+stub_bpy.install()
+
+from WarMDLImport import bl_info
+from WarMDLImport.importer import DataImporter
+from WarMDLImport.model import numpy
+from WarMDLImport.parser import parse_file
+from WarMDLImport.stats import Stats
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark building models with a stub bpy.")
+	parser.add_argument('file', nargs='?', help="file to build instead of a synthetic model")
+	parser.add_argument('--repeat', type=int, default=3, help="runs, the fastest counts")
+	parser.add_argument('--json', help="also write the results to this file")
+	parser.add_argument('--instance-meshes', action='store_true',
+		help="share meshes between the runs, so all but the first reuse them")
+	generate.add_arguments(parser)
+	args = parser.parse_args()
+
+	if args.file:
+		model = parse_file(args.file)
+	else:
+		fd, filepath = tempfile.mkstemp(suffix='.mdl')
+		try:
+			with os.fdopen(fd, 'w') as out:
+				generate.generate(out, seed=args.seed, **generate.counts(args))
+			model = parse_file(filepath)
+		finally:
+			os.remove(filepath)
+
+	best = None
+	for i in range(args.repeat):
+		stats = Stats()
+		start = time.perf_counter()
+		DataImporter(stats, args.instance_meshes).build(model, None)
+		seconds = time.perf_counter() - start
+		if best is None or seconds < best[0]:
+			best = seconds, stats
+	seconds, stats = best
+
+	vertices = stats.counters.get('vertices', 0)
+	print("build {:.3f} s, {:.0f} vertices/s".format(seconds, vertices / seconds))
+	for name, (calls, total) in sorted(stats.timers.items(), key=lambda item: -item[1][1]):
+		print("  {:<24} {:>9.3f} s {:>8} calls".format(name, total, calls))
+
+	if args.json:
+		report = {
+			'version': '.'.join(str(n) for n in bl_info['version']),
+			'python': platform.python_version(),
+			'numpy': numpy is not None,
+			'seconds': seconds,
+			'vertices_per_s': vertices / seconds,
+			'stats': stats.as_dict(),
+			}
+		with open(args.json, 'w') as outfile:
+			json.dump(report, outfile, indent=1, sort_keys=True)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,113 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Measures the throughput and peak memory of the parsing core, without Blender.
+# Parses either the given files or a synthetic model (see generate.py):
+#
+#   python benchmarks/bench_parse.py --vertices 50000 --json parse.json
+#   python benchmarks/bench_parse.py Footman.mdl Footman.mdx
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WarMDLImport import bl_info
+from WarMDLImport.model import numpy
+from WarMDLImport.parser import parse_file
+from WarMDLImport.stats import Stats
+
+import generate
+
+# Parses a file repeat times and returns the results of the fastest run.
+# @param workers: Processes parsing the geosets, see parser.parse_file().
+def bench_file(filepath, repeat, workers=1):
+	size = os.path.getsize(filepath)
+	best = None
+	for i in range(repeat):
+		stats = Stats()
+		start = time.perf_counter()
+		model = parse_file(filepath, stats=stats, workers=workers)
+		seconds = time.perf_counter() - start
+		if best is None or seconds < best[0]:
+			best = seconds, stats
+	seconds, stats = best
+
+	# tracemalloc slows everything down, so memory gets a run of its own.
+	tracemalloc.start()
+	parse_file(filepath)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	vertices = sum(len(g.vertices) // 3 for g in model.geosets)
+	return {
+		'file': os.path.basename(filepath),
+		'bytes': size,
+		'vertices': vertices,
+		'faces': sum(len(g.faces) // 3 for g in model.geosets),
+		'nodes': len(model.skeleton),
+		'seconds': seconds,
+		'mb_per_s': size / seconds / 1e6,
+		'vertices_per_s': vertices / seconds,
+		'peak_memory': peak,
+		'stages': stats.as_dict()['timers'],
+		}
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the MDL/MDX parser.")
+	parser.add_argument('files', nargs='*', help="files to parse instead of a synthetic model")
+	parser.add_argument('--repeat', type=int, default=3, help="runs per file, the fastest counts")
+	parser.add_argument('--json', help="also write the results to this file")
+	parser.add_argument('--workers', type=int, default=1,
+		help="processes parsing the geosets of a file, 0 for one per core")
+	generate.add_arguments(parser)
+	args = parser.parse_args()
+
+	tmpdir = None
+	filepaths = args.files
+	if not filepaths:
+		tmpdir = tempfile.mkdtemp()
+		filepath = os.path.join(tmpdir, 'synthetic.mdl')
+		with open(filepath, 'w') as out:
+			generate.generate(out, seed=args.seed, **generate.counts(args))
+		filepaths = [filepath]
+
+	try:
+		results = [bench_file(filepath, args.repeat, args.workers or None) for filepath in filepaths]
+	finally:
+		if tmpdir:
+			os.remove(filepaths[0])
+			os.rmdir(tmpdir)
+
+	print("{:<24} {:>9} {:>9} {:>12} {:>10}".format("file", "seconds", "MB/s", "vertices/s", "peak MB"))
+	for r in results:
+		print("{file:<24} {seconds:>9.3f} {mb_per_s:>9.2f} {vertices_per_s:>12.0f} {0:>10.1f}".format(
+			r['peak_memory'] / 1e6, **r))
+
+	if args.json:
+		report = {
+			'version': '.'.join(str(n) for n in bl_info['version']),
+			'python': platform.python_version(),
+			'numpy': numpy is not None,
+			'workers': args.workers,
+			'results': results,
+			}
+		with open(args.json, 'w') as outfile:
+			json.dump(report, outfile, indent=1, sort_keys=True)
+
+if __name__ == '__main__':
+	main()
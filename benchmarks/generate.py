@@ -0,0 +1,131 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Writes synthetic MDL (version 800) files for the benchmarks. The numbers are
+# random but seeded, so the same arguments always give the same file:
+#
+#   python benchmarks/generate.py big.mdl --geosets 4 --vertices 50000
+
+import argparse
+import random
+
+# Default size of a generated model, roughly a big unit.
+defaults = {
+	'geosets': 4,
+	'vertices': 20000,
+	'faces': 30000,
+	'groups': 16,
+	'bones': 32,
+	'helpers': 8,
+	'cameras': 1,
+	'sequences': 4,
+	'keys': 50,
+	}
+
+def _vectors(r, count, width, scale):
+	return ''.join('\t\t{{ {} }},\n'.format(', '.join('{:.6f}'.format(r.uniform(-scale, scale))
+		for c in range(width))) for i in range(count))
+
+# Writes one Geoset block.
+def _geoset(out, r, vertices, faces, groups, bones):
+	out.write('Geoset {\n')
+	out.write('\tVertices {} {{\n'.format(vertices))
+	out.write(_vectors(r, vertices, 3, 100))
+	out.write('\t}}\n\tNormals {} {{\n'.format(vertices))
+	out.write(_vectors(r, vertices, 3, 1))
+	out.write('\t}}\n\tTVertices {} {{\n'.format(vertices))
+	out.write(''.join('\t\t{{ {:.6f}, {:.6f} }},\n'.format(r.random(), r.random()) for i in range(vertices)))
+	out.write('\t}\n\tVertexGroup {\n')
+	out.write(''.join('\t\t{},\n'.format(r.randrange(groups)) for i in range(vertices)))
+	out.write('\t}}\n\tFaces 1 {} {{\n\t\tTriangles {{\n\t\t\t{{ '.format(faces * 3))
+	out.write(', '.join(str(r.randrange(vertices)) for i in range(faces * 3)))
+	out.write(' },\n\t\t}\n\t}\n')
+	matrices = [r.sample(range(bones), min(bones, r.randint(1, 3))) for i in range(groups)]
+	out.write('\tGroups {} {} {{\n'.format(groups, sum(len(m) for m in matrices)))
+	for m in matrices:
+		out.write('\t\tMatrices {{ {} }},\n'.format(', '.join(str(b) for b in m)))
+	out.write('\t}\n\tMinimumExtent { -100, -100, -100 },\n\tMaximumExtent { 100, 100, 100 },\n')
+	out.write('\tBoundsRadius 173.2,\n\tMaterialID 0,\n\tSelectionGroup 0,\n}\n')
+
+# Writes a Translation (Linear) or Rotation (Hermite) track with keys spread
+# over the whole timeline.
+def _track(out, r, name, keys, length):
+	times = sorted(r.sample(range(length), min(keys, length)))
+	if name == 'Translation':
+		out.write('\tTranslation {} {{\n\t\tLinear,\n'.format(len(times)))
+		for time in times:
+			out.write('\t\t{}: {{ {:.4f}, {:.4f}, {:.4f} }},\n'.format(time,
+				r.uniform(-10, 10), r.uniform(-10, 10), r.uniform(-10, 10)))
+	else:
+		out.write('\tRotation {} {{\n\t\tHermite,\n'.format(len(times)))
+		for time in times:
+			q = '{{ 0, 0, {:.4f}, {:.4f} }}'.format(r.uniform(-1, 1), r.uniform(-1, 1))
+			out.write('\t\t{}: {},\n\t\t\tInTan {},\n\t\t\tOutTan {},\n'.format(time, q, q, q))
+	out.write('\t}\n')
+
+# Writes a synthetic model.
+# @param out: A text mode file object.
+# @param seed: Seed of the random numbers.
+# The other arguments are the counts, see defaults. vertices and faces are per
+# geoset, keys per animated track.
+def generate(out, seed=1, **counts):
+	c = dict(defaults)
+	c.update(counts)
+	r = random.Random(seed)
+	nodes = c['bones'] + c['helpers']
+	length = 1000 * max(c['sequences'], 1)
+
+	out.write('// Synthetic benchmark model\nVersion {\n\tFormatVersion 800,\n}\n')
+	out.write('Model "Synthetic" {{\n\tNumGeosets {},\n\tNumBones {},\n'.format(c['geosets'], c['bones']))
+	out.write('\tBlendTime 150,\n\tBoundsRadius 173.2,\n}\n')
+	if c['sequences']:
+		out.write('Sequences {} {{\n'.format(c['sequences']))
+		for i in range(c['sequences']):
+			out.write('\tAnim "Anim {}" {{\n\t\tInterval {{ {}, {} }},\n\t}}\n'.format(i, i * 1000, i * 1000 + 999))
+		out.write('}\n')
+	for g in range(c['geosets']):
+		_geoset(out, r, c['vertices'], c['faces'], c['groups'], max(c['bones'], 1))
+	for i in range(nodes):
+		kind = 'Bone' if i < c['bones'] else 'Helper'
+		out.write('{} "{}{}" {{\n\tObjectId {},\n'.format(kind, kind, i, i))
+		if i:
+			out.write('\tParent {},\n'.format(r.randrange(i)))
+		if kind == 'Bone':
+			out.write('\tGeosetId {},\n'.format(r.randrange(c['geosets']) if c['geosets'] else 'Multiple'))
+		if c['keys']:
+			_track(out, r, 'Translation', c['keys'], length)
+			_track(out, r, 'Rotation', c['keys'], length)
+		out.write('}\n')
+	out.write('PivotPoints {} {{\n'.format(nodes))
+	out.write(_vectors(r, nodes, 3, 100).replace('\t\t', '\t'))
+	out.write('}\n')
+	for i in range(c['cameras']):
+		out.write('Camera "Camera{}" {{\n\tPosition {{ 300, 0, 100 }},\n\tFieldOfView 0.785,\n'.format(i))
+		out.write('\tFarClip 10000,\n\tNearClip 8,\n\tTarget {\n\t\tPosition { 0, 0, 50 },\n\t}\n}\n')
+
+# Adds the count options to an ArgumentParser.
+def add_arguments(parser):
+	for name, value in sorted(defaults.items()):
+		parser.add_argument('--' + name, type=int, default=value,
+			help="default: {}".format(value))
+	parser.add_argument('--seed', type=int, default=1)
+
+# Returns the counts from parsed arguments as keyword arguments for generate().
+def counts(args):
+	return dict((name, getattr(args, name)) for name in defaults)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Write a synthetic MDL file.")
+	parser.add_argument('output')
+	add_arguments(parser)
+	args = parser.parse_args()
+	with open(args.output, 'w') as out:
+		generate(out, seed=args.seed, **counts(args))
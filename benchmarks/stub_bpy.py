@@ -0,0 +1,202 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# Just enough of bpy and mathutils to run DataImporter.build() outside of
+# Blender. Nothing is built, but all data we hand to Blender is copied once like
+# foreach_set() would, so the benchmark measures the Python side of building:
+# preparing the arrays, the vertex groups, the keyframes and so on.
+
+import sys
+import types
+from array import array
+
+# Accepts any attribute, call or assignment.
+class Anything:
+	def __init__(self, *args, **kwargs):
+		pass
+
+	def __getattr__(self, name):
+		value = Anything()
+		setattr(self, name, value)
+		return value
+
+	def __call__(self, *args, **kwargs):
+		return Anything()
+
+	def __getitem__(self, key):
+		return Anything()
+
+# A collection like MeshVertices or FCurveKeyframePoints.
+class Collection(Anything):
+	def __init__(self, *args, **kwargs):
+		self.items = []
+
+	def add(self, count):
+		self.items.extend(Anything() for i in range(count))
+
+	def foreach_set(self, attr, seq):
+		# Blender copies the whole sequence, so do we.
+		array('f', seq)
+
+	def __len__(self):
+		return len(self.items)
+
+	def __iter__(self):
+		return iter(self.items)
+
+	def __getitem__(self, key):
+		return self.items[key]
+
+class VertexGroup(Anything):
+	def add(self, indices, weight, mode):
+		list(indices)
+
+class VertexGroups(Anything):
+	def __init__(self, *args, **kwargs):
+		self.groups = {}
+
+	def get(self, name):
+		return self.groups.get(name)
+
+	def new(self, name):
+		group = self.groups[name] = VertexGroup()
+		return group
+
+class UVLayer(Anything):
+	def __init__(self, *args, **kwargs):
+		self.data = Collection()
+
+# Any ID datablock, with custom properties.
+class ID(Anything):
+	def __init__(self, name='', *args, **kwargs):
+		self.name = name
+		self.properties = {}
+
+	def get(self, key, default=None):
+		return self.properties.get(key, default)
+
+	def __getitem__(self, key):
+		return self.properties[key]
+
+	def __setitem__(self, key, value):
+		self.properties[key] = value
+
+class Mesh(ID):
+	def __init__(self, *args, **kwargs):
+		ID.__init__(self, *args, **kwargs)
+		self.vertices = Collection()
+		self.loops = Collection()
+		self.polygons = Collection()
+		self.uv_layers = [UVLayer()]
+		self.materials = []
+
+	def normals_split_custom_set_from_vertices(self, normals):
+		list(normals)
+
+	def normals_split_custom_set(self, normals):
+		list(normals)
+
+class Object(Anything):
+	def __init__(self, *args, **kwargs):
+		self.vertex_groups = VertexGroups()
+		self.material_slots = [Anything()]
+
+class TextureSlots(Anything):
+	def add(self):
+		return Anything()
+
+class Material(ID):
+	def __init__(self, *args, **kwargs):
+		ID.__init__(self, *args, **kwargs)
+		self.texture_slots = TextureSlots()
+
+class EditBones(Anything):
+	def new(self, name):
+		bone = Anything()
+		bone.name = name
+		return bone
+
+class Armature(Anything):
+	def __init__(self, *args, **kwargs):
+		self.edit_bones = EditBones()
+
+class FCurve(Anything):
+	def __init__(self, *args, **kwargs):
+		self.keyframe_points = Collection()
+
+class FCurves(Anything):
+	def new(self, *args, **kwargs):
+		return FCurve()
+
+class Action(Anything):
+	def __init__(self, *args, **kwargs):
+		self.fcurves = FCurves()
+
+# A bpy.data.<name> collection whose new() creates cls objects.
+class DataBlocks(Anything):
+	def __init__(self, cls):
+		self.cls = cls
+		self.blocks = {}
+
+	def new(self, name, *args, **kwargs):
+		block = self.cls(name)
+		# Blender would rename the new block, we just replace the old one.
+		self.blocks[name] = block
+		return block
+
+	def get(self, name, default=None):
+		return self.blocks.get(name, default)
+
+	def load(self, filepath):
+		return self.new(filepath)
+
+	def __len__(self):
+		return len(self.blocks)
+
+# Puts the stub modules into sys.modules, so `import bpy` finds them. Call
+# this before importing WarMDLImport.importer.
+def install():
+	bpy = types.ModuleType('bpy')
+	bpy.data = Anything()
+	bpy.data.meshes = DataBlocks(Mesh)
+	bpy.data.objects = DataBlocks(Object)
+	bpy.data.armatures = DataBlocks(Armature)
+	bpy.data.actions = DataBlocks(Action)
+	bpy.data.cameras = DataBlocks(Anything)
+	bpy.data.images = DataBlocks(ID)
+	bpy.data.materials = DataBlocks(Material)
+	bpy.data.textures = DataBlocks(Anything)
+	bpy.context = Anything()
+	bpy.context.scene.render.fps = 30
+	bpy.context.scene.render.fps_base = 1.0
+	bpy.ops = Anything()
+	bpy.app = Anything()
+	bpy.path = Anything()
+	bpy.utils = Anything()
+	bpy.types = types.ModuleType('bpy.types')
+	bpy.types.Operator = type('Operator', (), {})
+	bpy.types.OperatorFileListElement = type('OperatorFileListElement', (), {})
+	bpy.props = types.ModuleType('bpy.props')
+	for name in ('BoolProperty', 'CollectionProperty', 'EnumProperty', 'IntProperty', 'StringProperty'):
+		setattr(bpy.props, name, Anything)
+	bpy_extras = types.ModuleType('bpy_extras')
+	bpy_extras.io_utils = types.ModuleType('bpy_extras.io_utils')
+	bpy_extras.io_utils.ImportHelper = type('ImportHelper', (), {})
+	mathutils = types.ModuleType('mathutils')
+	mathutils.Matrix = Anything()
+	sys.modules.update({
+		'bpy': bpy,
+		'bpy.types': bpy.types,
+		'bpy.props': bpy.props,
+		'bpy_extras': bpy_extras,
+		'bpy_extras.io_utils': bpy_extras.io_utils,
+		'mathutils': mathutils,
+		})
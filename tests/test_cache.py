@@ -0,0 +1,51 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+import io
+import shutil
+import tempfile
+import unittest
+
+from WarMDLImport.cache import ParseCache, dump_model, load_model
+from WarMDLImport.parser import parse_file
+from WarMDLImport.stats import Stats
+
+from .test_parser import data_path, flatten
+
+class CacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_dump_load(self):
+		m = parse_file(data_path('footman.mdl'))
+		self.assertEqual(m.materials[0]['layers'][1]['Alpha'], 0.5)
+		outfile = io.BytesIO()
+		dump_model(m, outfile)
+		outfile.seek(0)
+		self.assertEqual(flatten(load_model(outfile)), flatten(m))
+
+	def test_hits(self):
+		cache = ParseCache(self.directory)
+		stats = Stats()
+		first = cache.parse_file(data_path('footman.mdl'), stats=stats)
+		second = cache.parse_file(data_path('footman.mdl'), stats=stats)
+		self.assertEqual(stats.counters['cache.misses'], 1)
+		self.assertEqual(stats.counters['cache.hits'], 1)
+		self.assertEqual(flatten(second), flatten(first))
+		# Reading only some parts is cached apart.
+		cache.parse_file(data_path('footman.mdl'), parts={'SKELETON'}, stats=stats)
+		self.assertEqual(stats.counters['cache.misses'], 2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,76 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+
+import unittest
+from unittest import mock
+
+from WarMDLImport import lexer
+from WarMDLImport.lexer import EOF, IDENT, NUMBER, STRING, ParseError, TokenStream, numbers
+
+class TokenStreamTest(unittest.TestCase):
+	def test_tokens(self):
+		t = TokenStream('Bone "Root" { // comment\n\tObjectId 0,\n}', 10)
+		tokens = []
+		while t.peek()[0] != EOF:
+			tokens.append(t.next())
+		self.assertEqual(tokens, [(IDENT, 'Bone'), (STRING, 'Root'), ('{', '{'),
+			(IDENT, 'ObjectId'), (NUMBER, '0'), (',', ','), ('}', '}')])
+		self.assertEqual(t.line(), 12)
+
+	def test_raw_block(self):
+		t = TokenStream('Vertices 2 {\n\t{ 1, 2, 3 },\n\t{ 4, 5, 6 },\n}\nNormals')
+		self.assertEqual(t.expect(IDENT), 'Vertices')
+		self.assertEqual(t.expect(NUMBER), '2')
+		t.expect('{')
+		self.assertEqual(numbers(t.raw_block()).tolist(), [1, 2, 3, 4, 5, 6])
+		self.assertEqual(t.next(), (IDENT, 'Normals'))
+
+	def test_errors(self):
+		t = TokenStream('Vertices {\n\t{ 1, 2, 3 },\n', 5)
+		with self.assertRaises(ParseError) as cm:
+			t.expect(NUMBER)
+		self.assertEqual((cm.exception.line, cm.exception.reason), (5, "expected 'number', got 'Vertices'"))
+		t.expect('{')
+		with self.assertRaises(ParseError) as cm:
+			t.raw_block()
+		self.assertEqual(cm.exception.reason, "block is never closed")
+
+# Braces in comments and strings don't end a block.
+class BlockEndTest(unittest.TestCase):
+	def test_block_end(self):
+		# Each of these blocks ends right before the last ' x'.
+		for text in ('1, 2 } x', '// old } style\n\tObjectId 2,\n} x', '"a}" } x', '1 / 2 } x',
+				'{ { { "}" } // }\n } } } x', '{ { { { // {\n } } } } } x'):
+			for data in (text, text.encode('ascii')):
+				self.assertEqual(lexer.block_end(data, 0), len(text) - 2, text)
+		for text in ('// }', '{ { { { // }\n } } } }'):
+			for data in (text, text.encode('ascii')):
+				self.assertEqual(lexer.block_end(data, 0), -1, text)
+
+class NumbersTest(unittest.TestCase):
+	def check_numbers(self):
+		self.assertEqual(numbers('{ 1.5, -2 }, { 3e2, .5 }').tolist(), [1.5, -2, 300, 0.5])
+		self.assertEqual(numbers('{ 0, 1, 4294967295 }', 'I').tolist(), [0, 1, 4294967295])
+		for text, typecode in (('1 x 2', 'f'), ('1 -1 2', 'I'), ('1 4294967296', 'I'), ('1 2.5', 'I')):
+			with self.assertRaises((ValueError, OverflowError)):
+				numbers(text, typecode)
+
+	@unittest.skipIf(lexer.numpy is None, "needs NumPy")
+	def test_numpy(self):
+		self.check_numbers()
+
+	def test_without_numpy(self):
+		with mock.patch.object(lexer, 'numpy', None):
+			self.check_numbers()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,59 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+
+import struct
+import unittest
+
+from WarMDLImport.lexer import ParseError
+from WarMDLImport.mdx import MDXReader
+
+from WarMDLImport.parser import parse_file
+
+from .test_parser import data_path, flatten
+
+# Returns the contents of footman.mdx with the inclusive size of the first
+# record in a chunk replaced.
+def with_record_size(tag, size):
+	with open(data_path('footman.mdx'), 'rb') as infile:
+		data = bytearray(infile.read())
+	offset = data.index(tag) + 8
+	struct.pack_into('<I', data, offset, size)
+	return bytes(data)
+
+class MDXTest(unittest.TestCase):
+	def test_matches_mdl(self):
+		mdl = flatten(parse_file(data_path('footman.mdl')))
+		mdx = flatten(parse_file(data_path('footman.mdx')))
+		self.assertEqual(mdx['info']['name'], mdl['info']['name'])
+		for key in ('materials', 'textures', 'material_ids', 'pivots'):
+			self.assertEqual(mdx[key], mdl[key], key)
+		self.assertEqual([len(g['vertices']) for g in mdx['geosets']],
+			[len(g['vertices']) for g in mdl['geosets']])
+		self.assertEqual(mdx['geosets'][0]['faces'], mdl['geosets'][0]['faces'])
+		self.assertEqual([n['bone_name'] for n in mdx['skeleton']], [n['bone_name'] for n in mdl['skeleton']])
+
+	def test_bad_record_sizes(self):
+		for tag in (b'HELP', b'BONE', b'MTLS', b'GEOS'):
+			for size in (0, 1 << 30):
+				data = with_record_size(tag, size)
+				with self.assertRaises(ParseError):
+					MDXReader(data).run()
+				m = MDXReader(data, recover=True).run()
+				self.assertEqual([d['block'] for d in m.diagnostics], [tag.decode('ascii')])
+
+	def test_recover_skips_chunk(self):
+		m = MDXReader(with_record_size(b'HELP', 0), recover=True).run()
+		self.assertEqual([n['type'] for n in m.skeleton], ['Bone', 'Bone', 'Attachment'])
+		self.assertEqual(len(m.geosets), 2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,61 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+
+import unittest
+from array import array
+from unittest import mock
+
+from WarMDLImport import model
+from WarMDLImport.model import Geoset
+
+# Returns a quad of two triangles whose UVs have a seam along its diagonal:
+# vertices 0 and 3 sit at the same place, but have different UVs.
+def seam_geoset():
+	geoset = Geoset()
+	geoset.vertices = array('f', [0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 0])
+	geoset.normals = array('f', [0, 0, 1] * 4)
+	geoset.tvertices = array('f', [0, 0, 1, 0, 0, 1, 1, 1])
+	geoset.vgroups = array('I', [0, 0, 0, 0])
+	geoset.faces = array('I', [0, 1, 2, 3, 2, 1])
+	geoset.matrices = array('I', [0])
+	geoset.matrix_sizes = array('I', [1])
+	return geoset
+
+# Returns the buffers of a geoset as lists.
+def buffers(geoset):
+	return dict((name, getattr(geoset, name).tolist()) for name in Geoset.__slots__)
+
+class GeosetTest(unittest.TestCase):
+	def test_group_members(self):
+		geoset = Geoset()
+		geoset.matrix_sizes = array('I', [1, 2])
+		geoset.vgroups = array('I', [1, 0, 1, 5])
+		self.assertEqual([m.tolist() for m in geoset.group_members()], [[1], [0, 2]])
+
+	def check_weld_split(self):
+		geoset = seam_geoset()
+		welded, loop_uvs, loop_normals = geoset.weld()
+		self.assertEqual(len(welded.vertices), 9)
+		self.assertEqual(welded.faces.tolist(), [0, 1, 2, 0, 2, 1])
+		triangles = array('I', range(len(welded.faces)))
+		split = welded.split(welded.faces, loop_uvs, loop_normals, triangles)
+		self.assertEqual(buffers(split), buffers(geoset))
+
+	def test_weld_split(self):
+		self.check_weld_split()
+
+	def test_weld_split_without_numpy(self):
+		with mock.patch.object(model, 'numpy', None):
+			self.check_weld_split()
+
+if __name__ == '__main__':
+	unittest.main()
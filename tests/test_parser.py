@@ -0,0 +1,163 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+import os
+import unittest
+from unittest import mock
+
+from WarMDLImport import lexer, model, parser
+from WarMDLImport.parser import ModelParser, parse_file
+
+data_directory = os.path.join(os.path.dirname(__file__), 'data')
+
+# Returns the path of a file in tests/data.
+def data_path(name):
+	return os.path.join(data_directory, name)
+
+# Parses a file without NumPy, through the array.array code paths.
+def parse_without_numpy(filepath, **kwargs):
+	with mock.patch.object(lexer, 'numpy', None), mock.patch.object(model, 'numpy', None):
+		return parse_file(filepath, **kwargs)
+
+# Returns everything in a Model as plain lists and dicts, for comparing.
+def flatten(m):
+	state = dict(vars(m))
+	del state['geosets'], state['nodes']
+	state['geosets'] = [dict((name, getattr(g, name).tolist()) for name in model.Geoset.__slots__)
+		for g in m.geosets]
+	return state
+
+class ParseTest(unittest.TestCase):
+	def check_footman(self, m):
+		self.assertEqual(m.info['name'], 'Footman')
+		self.assertEqual(len(m.geosets), 2)
+		first = m.geosets[0]
+		self.assertEqual(len(first.vertices), 12)
+		self.assertEqual(first.faces.tolist(), [0, 1, 2, 0, 2, 3])
+		self.assertEqual(first.vgroups.tolist(), [0, 0, 1, 1])
+		self.assertEqual(first.groups(), [[0], [0, 1]])
+		self.assertAlmostEqual(first.vertices[3], 1.0)
+		translation = m.nodes[0]['Translation']
+		self.assertEqual(translation['times'].tolist(), [0, 1000])
+		self.assertEqual(m.nodes[0]['Rotation']['in_tans'].tolist()[:4], [0, 0, 0, 1])
+
+	@unittest.skipIf(lexer.numpy is None, "needs NumPy")
+	def test_numpy(self):
+		self.check_footman(parse_file(data_path('footman.mdl')))
+
+	def test_without_numpy(self):
+		self.check_footman(parse_without_numpy(data_path('footman.mdl')))
+
+	@unittest.skipIf(lexer.numpy is None, "needs NumPy")
+	def test_numpy_matches_arrays(self):
+		self.assertEqual(flatten(parse_file(data_path('footman.mdl'))),
+			flatten(parse_without_numpy(data_path('footman.mdl'))))
+
+	def test_workers(self):
+		self.assertEqual(flatten(parse_file(data_path('footman.mdl'), workers=2)),
+			flatten(parse_file(data_path('footman.mdl'))))
+
+	# Only the first UV set is read, like from MDX files.
+	def test_second_uv_set(self):
+		with open(data_path('footman.mdl')) as infile:
+			text = infile.read()
+		uvs = '\tTVertices 4 {\n\t\t{ 0, 0 },\n\t\t{ 1, 0 },\n\t\t{ 1, 1 },\n\t\t{ 0, 1 },\n\t}\n'
+		self.assertIn(uvs, text)
+		m = ModelParser().run_mapped(text.replace(uvs, uvs + uvs.replace('1', '0.5')).encode('ascii'))
+		self.assertEqual(m.geosets[0].tvertices.tolist(), [0, 1, 1, 1, 1, 0, 0, 0])
+
+	# Braces in comments don't end a block.
+	def test_comment_braces(self):
+		with open(data_path('footman.mdl')) as infile:
+			text = infile.read()
+		helper = 'Helper "Bone_Root" {\n'
+		self.assertIn(helper, text)
+		text = text.replace(helper, 'Helper "Bone_Root" { // old } style\n')
+		node = ModelParser().run_mapped(text.encode('ascii')).nodes[2]
+		self.assertEqual((node['bone_name'], node['id'], node['parent']), ('Bone_Root', 2, 0))
+		self.assertEqual(node['pivot_point'], [0.0, 0.0, 1.0])
+
+	# One worker per core only starts a pool for big files.
+	def test_parallel_bytes(self):
+		with mock.patch.object(parser.os, 'cpu_count', return_value=4), \
+				mock.patch.object(parser, 'ProcessPoolExecutor', side_effect=AssertionError):
+			self.check_footman(parse_file(data_path('footman.mdl'), workers=None))
+			with mock.patch.object(parser, 'parallel_bytes', 0), self.assertRaises(AssertionError):
+				parse_file(data_path('footman.mdl'), workers=None)
+
+# Animation tracks with unusual key blocks.
+class TrackTest(unittest.TestCase):
+	translation = '\tTranslation 2 {\n\t\tLinear,\n\t\t0: { 0, 0, 0 },\n\t\t1000: { 0, 0, 10 },\n\t}\n'
+
+	# Parses footman.mdl with the Translation track of the bone Root replaced.
+	def parse(self, old, new):
+		with open(data_path('footman.mdl')) as infile:
+			text = infile.read()
+		self.assertIn(old, text)
+		return ModelParser().run_mapped(text.replace(old, new).encode('ascii'))
+
+	def test_empty_track(self):
+		m = self.parse(self.translation, '\tTranslation 0 {\n\t}\n')
+		track = m.nodes[0]['Translation']
+		self.assertEqual((track['interpolation'], len(track['times']), len(track['values'])), ('DontInterp', 0, 0))
+
+	def test_missing_interpolation(self):
+		with self.assertRaises(lexer.ParseError) as cm:
+			self.parse(self.translation, '\tTranslation 2 {\n\t}\n')
+		self.assertEqual(cm.exception.reason, 'missing interpolation')
+
+	# Materials only keep the first key of an animated value.
+	def test_material_keys(self):
+		alpha = '\t\t\tAlpha 2 {\n\t\t\t\tLinear,\n\t\t\t\t0: 0.5,\n\t\t\t\t500: 1,\n\t\t\t}\n'
+		self.assertEqual(self.parse(alpha, alpha).materials[0]['layers'][1]['Alpha'], 0.5)
+		# Without keys the layer gets the default.
+		m = self.parse(alpha, '\t\t\tAlpha 0 {\n\t\t\t}\n')
+		self.assertEqual(m.materials[0]['layers'][1]['Alpha'], 1.0)
+
+# Reading only parts of a file, from both readers.
+class PartsTest(unittest.TestCase):
+	def models(self, **kwargs):
+		return [parse_file(data_path(name), **kwargs) for name in ('footman.mdl', 'footman.mdx')]
+
+	def test_skeleton(self):
+		for m in self.models(parts={'SKELETON'}):
+			self.assertEqual([n['bone_name'] for n in m.skeleton], ['Root', 'Arm', 'Bone_Root', 'Origin Ref'])
+			self.assertEqual(m.nodes[1]['pivot_point'], [0.0, 0.0, 2.5])
+			# Without 'ANIMATION' there are no tracks.
+			self.assertNotIn('Translation', m.nodes[0])
+			self.assertEqual((len(m.geosets), m.camera, m.sequences, m.materials), (0, {}, [], []))
+
+	def test_camera(self):
+		for m in self.models(parts={'CAMERA'}):
+			self.assertEqual(m.camera['name'], 'Camera01')
+			self.assertAlmostEqual(m.camera['FieldOfView'], 0.785, places=6)
+			self.assertEqual((len(m.geosets), m.skeleton), (0, []))
+
+	def test_bounds(self):
+		for m in self.models(parts={'BOUNDS'}):
+			self.assertEqual([len(g.vertices) for g in m.geosets], [0, 0])
+			self.assertEqual([e['MinimumExtent'] for e in m.extents], [[0, 0, 0], [0, 0, 2]])
+			self.assertEqual([e['MaximumExtent'] for e in m.extents], [[1, 1, 0], [1, 1, 2]])
+			self.assertAlmostEqual(m.extents[1]['BoundsRadius'], 0.705, places=6)
+			self.assertEqual(m.skeleton, [])
+
+	def test_geosets(self):
+		for m in self.models(geosets=[1]):
+			self.assertEqual(len(m.geosets), 1)
+			self.assertEqual(len(m.geosets[0].vertices), 9)
+			self.assertEqual(m.geosets[0].faces.tolist(), [0, 1, 2])
+			self.assertEqual([e['MinimumExtent'] for e in m.extents], [[0, 0, 2]])
+			# Everything else is read as usual.
+			self.assertEqual(len(m.skeleton), 4)
+			self.assertEqual(len(m.sequences), 2)
+
+if __name__ == '__main__':
+	unittest.main()
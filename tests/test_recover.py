@@ -0,0 +1,105 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from WarMDLImport.lexer import ParseError
+from WarMDLImport.parser import parse_file
+
+from .test_parser import data_path, parse_without_numpy
+
+# Parses a broken copy of footman.mdl, strictly and with recover, with and
+# without NumPy.
+class RecoverTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		with open(data_path('footman.mdl')) as infile:
+			self.text = infile.read()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	# Writes footman.mdl with old replaced by new and returns its path.
+	def broken(self, old, new):
+		self.assertIn(old, self.text)
+		filepath = os.path.join(self.directory, 'broken.mdl')
+		with open(filepath, 'w') as outfile:
+			outfile.write(self.text.replace(old, new, 1))
+		return filepath
+
+	# Checks that a broken file fails strictly and is read with recover,
+	# returns the models read with and without NumPy.
+	def recover(self, filepath, block, line):
+		models = []
+		for parse in (parse_file, parse_without_numpy):
+			with self.assertRaises(ParseError) as cm:
+				parse(filepath)
+			self.assertEqual(cm.exception.line, line)
+			m = parse(filepath, recover=True)
+			errors = [d for d in m.diagnostics if d['severity'] == 'error']
+			self.assertEqual([(d['block'], d['line']) for d in errors], [(block, line)])
+			models.append(m)
+		return models
+
+	def test_negative_face_index(self):
+		for m in self.recover(self.broken('{ 0, 1, 2, 0, 2, 3 }', '{ 0, 1, 2, 0, -2, 3 }'), 'Geoset', 79):
+			# The broken geoset is left empty, the others keep their index.
+			self.assertEqual(len(m.geosets), 2)
+			self.assertEqual(len(m.geosets[0].vertices), 0)
+			self.assertEqual(m.geosets[1].faces.tolist(), [0, 1, 2])
+			self.assertEqual(len(m.skeleton), 4)
+
+	def test_workers(self):
+		filepath = self.broken('{ 0, 1, 2, 0, 2, 3 }', '{ 0, 1, 2, 0, -2, 3 }')
+		self.assertEqual(parse_file(filepath, workers=2, recover=True).diagnostics,
+			parse_file(filepath, recover=True).diagnostics)
+
+	def test_huge_face_index(self):
+		self.recover(self.broken('{ 0, 1, 2, 0, 2, 3 }', '{ 0, 1, 2, 0, 99999999999, 3 }'), 'Geoset', 79)
+
+	def test_vertex_group_count(self):
+		self.recover(self.broken('\t\t1,\n\t\t1,\n\t}', '\t\t1,\n\t}'), 'Geoset', 73)
+
+	def test_bad_number(self):
+		self.recover(self.broken('{ 20, 0, 0 }', '{ 20, x, 0 }'), 'Geoset', 55)
+
+	def test_bad_bone(self):
+		for m in self.recover(self.broken('Parent 2,', 'Parent ,'), 'Bone', 156):
+			self.assertEqual([n['bone_name'] for n in m.skeleton], ['Root', 'Bone_Root', 'Origin Ref'])
+			self.assertEqual(len(m.geosets[0].vertices), 12)
+
+	def test_empty_track(self):
+		filepath = self.broken('\tTranslation 2 {\n\t\tLinear,\n\t\t0: { 0, 0, 0 },\n\t\t1000: { 0, 0, 10 },\n\t}',
+			'\tTranslation 2 {\n\t}')
+		for m in self.recover(filepath, 'Bone', 138):
+			self.assertEqual([n['bone_name'] for n in m.skeleton], ['Arm', 'Bone_Root', 'Origin Ref'])
+
+	def test_version(self):
+		filepath = self.broken('FormatVersion 800', 'FormatVersion 900')
+		with self.assertRaises(ParseError):
+			parse_file(filepath)
+		m = parse_file(filepath, recover=True)
+		self.assertEqual([(d['severity'], d['block']) for d in m.diagnostics], [('warning', 'Version')])
+		self.assertEqual(len(m.geosets), 2)
+
+	def test_cut_off(self):
+		filepath = self.broken(self.text, self.text[:self.text.index('MaterialID 0,')])
+		m = parse_file(filepath, recover=True)
+		self.assertEqual([(d['severity'], d['block'], d['index']) for d in m.diagnostics],
+			[('warning', 'Geoset', 0)])
+		self.assertEqual(len(m.geosets[0].vertices), 12)
+
+if __name__ == '__main__':
+	unittest.main()
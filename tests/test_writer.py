@@ -0,0 +1,55 @@
+# Copyright (c) 2011 Thomas Glamsch
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from WarMDLImport.parser import parse_file
+from WarMDLImport.writer import write_file
+
+from .test_parser import data_path, flatten
+
+# Writes models with write_file() and parses them again.
+class WriterTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def round_trip(self, m):
+		filepath = os.path.join(self.directory, 'written.mdl')
+		write_file(m, filepath)
+		return parse_file(filepath)
+
+	def test_round_trip(self):
+		m = parse_file(data_path('footman.mdl'))
+		written = flatten(self.round_trip(m))
+		expected = flatten(m)
+		# Attachments are written as Helpers.
+		self.assertEqual(expected['skeleton'][3]['type'], 'Attachment')
+		expected['skeleton'][3]['type'] = 'Helper'
+		self.assertEqual(written, expected)
+
+	# Vertices without a vertex group go to the first bone.
+	def test_no_vertex_groups(self):
+		m = parse_file(data_path('footman.mdl'))
+		for geoset in m.geosets:
+			geoset.vgroups, geoset.matrices, geoset.matrix_sizes = array('I'), array('I'), array('I')
+		written = self.round_trip(m)
+		self.assertEqual([g.vgroups.tolist() for g in written.geosets], [[0] * 4, [0] * 3])
+		self.assertEqual([g.groups() for g in written.geosets], [[[0]], [[0]]])
+
+if __name__ == '__main__':
+	unittest.main()